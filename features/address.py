@@ -1,4 +1,5 @@
 import geopandas as gpd
+import numpy as np
 import pandas as pd
 
 from util import count_dwithin, distance_nearest
@@ -18,19 +19,44 @@ def building_address_count(buildings: gpd.GeoDataFrame, addresses: gpd.GeoDataFr
 
 
 def building_address_unit_count(buildings: gpd.GeoDataFrame, addresses: gpd.GeoDataFrame, tolerance: float = 10) -> pd.Series:
-    address_units = addresses[addresses["number"].astype(str).str.contains(r"[A-Za-z]").fillna(False)]
+    address_units = addresses[_unit_mask(addresses)]
     addr_counts = count_dwithin(buildings, address_units, distance=tolerance)
 
     return addr_counts
 
 
-def distance_to_closest_address(buildings: gpd.GeoDataFrame, addresses: gpd.GeoDataFrame) -> gpd.GeoSeries:
+def building_address_counts(
+    buildings: gpd.GeoDataFrame, addresses: gpd.GeoDataFrame, tolerance: float = 10
+) -> pd.DataFrame:
+    """
+    Count the addresses and address units near each building from a single query of the buildings' spatial index.
+    """
+    addr_i, bldg_i = buildings.sindex.query(addresses.geometry, predicate="dwithin", distance=tolerance)
+    is_unit = _unit_mask(addresses)[addr_i]
+
+    return pd.DataFrame({
+        "count": np.bincount(bldg_i, minlength=len(buildings)),
+        "unit_count": np.bincount(bldg_i[is_unit], minlength=len(buildings)),
+    }, index=buildings.index)
+
+
+def distance_to_closest_address(
+    buildings: gpd.GeoDataFrame, addresses: gpd.GeoDataFrame, centroids: gpd.GeoSeries = None
+) -> gpd.GeoSeries:
+    if centroids is None:
+        centroids = buildings.centroid
+
     if "address_count" in buildings.columns:
         dis = pd.Series(index=buildings.index)
         mask = buildings["address_count"] == 0
         dis[~mask] = 0
-        dis[mask] = distance_nearest(buildings[mask].centroid, addresses, max_distance=100).fillna(100)
+        dis[mask] = distance_nearest(centroids[mask], addresses, max_distance=100).fillna(100)
     else:
-        dis = distance_nearest(buildings.centroid, addresses, max_distance=100).fillna(100)
+        dis = distance_nearest(centroids, addresses, max_distance=100).fillna(100)
 
     return dis
+
+
+def _unit_mask(addresses: gpd.GeoDataFrame) -> np.ndarray:
+    # house numbers with letters denote separate units of the same address
+    return addresses["number"].astype(str).str.contains(r"[A-Za-z]").fillna(False).to_numpy(dtype=bool)
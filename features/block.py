@@ -1,40 +1,42 @@
-import uuid
+import secrets
 
 import geopandas as gpd
 import networkx as nx
+import pandas as pd
 
-from util import extract_largest_polygon_from_multipolygon, simplified_rectangular_buffer
+from util import extract_largest_polygons_from_multipolygons, simplified_rectangular_buffer
 
 def generate_blocks(buildings: gpd.GeoDataFrame) -> gpd.GeoDataFrame:
-    geom = buildings[["geometry"]]
-    touching = gpd.sjoin(geom, geom, predicate="intersects")
-    touching = touching[touching.index != touching["index_right"]]
+    left_i, right_i = buildings.sindex.query(buildings.geometry.array, predicate="intersects")
+    touching = left_i != right_i
 
     graph = nx.Graph()
-    graph.add_edges_from(zip(touching.index, touching["index_right"]))
+    graph.add_edges_from(zip(buildings.index[left_i[touching]], buildings.index[right_i[touching]]))
     connected_components = list(nx.connected_components(graph))
 
-    blocks = []
-    for component in connected_components:
-        block_buildings = buildings.loc[list(component)]
-        blocks.append(
-            {
-                "geometry": block_buildings["geometry"].union_all(),
-                "building_ids": block_buildings["id"].values,
-                "block_id": uuid.uuid4().hex[:16],
-            }
-        )
+    # long-form mapping of building index to block number instead of one small frame per block
+    block_labels = pd.Series(
+        {bldg_idx: block_idx for block_idx, component in enumerate(connected_components) for bldg_idx in component},
+        dtype=int,
+    )
 
-    if blocks:
-        blocks_gdf = gpd.GeoDataFrame(blocks, geometry="geometry", crs=buildings.crs)
+    if len(block_labels):
+        block_buildings = buildings.loc[block_labels.index, ["id", "geometry"]].assign(block=block_labels.values)
+        blocks_gdf = (
+            block_buildings
+            .dissolve(by="block", aggfunc={"id": list})
+            .rename(columns={"id": "building_ids"})
+            .reset_index(drop=True)
+        )
+        blocks_gdf["block_id"] = _random_ids(len(blocks_gdf))
         blocks_gdf.geometry = simplified_rectangular_buffer(blocks_gdf, 0.01)  # ensure all geometries are Polygons and valid
-        blocks_gdf.geometry = blocks_gdf.geometry.apply(extract_largest_polygon_from_multipolygon)
+        blocks_gdf.geometry = extract_largest_polygons_from_multipolygons(blocks_gdf.geometry)
     else:
         blocks_gdf = gpd.GeoDataFrame(columns=["geometry", "building_ids", "block_id"])
 
     print(
         f"Generated {len(blocks_gdf)} blocks with on average "
-        f"{blocks_gdf['building_ids'].apply(len).mean():.1f} buildings."
+        f"{blocks_gdf['building_ids'].str.len().mean():.1f} buildings."
     )
 
     return blocks_gdf
@@ -52,7 +54,7 @@ def generate_blocks_from_ids(buildings: gpd.GeoDataFrame) -> gpd.GeoDataFrame:
     )
 
     blocks_gdf.geometry = simplified_rectangular_buffer(blocks_gdf, 0.01)  # ensure all geometries are Polygons and valid
-    blocks_gdf.geometry = blocks_gdf.geometry.apply(extract_largest_polygon_from_multipolygon)
+    blocks_gdf.geometry = extract_largest_polygons_from_multipolygons(blocks_gdf.geometry)
 
     return blocks_gdf
 
@@ -71,3 +73,10 @@ def merge_blocks_and_buildings(blocks: gpd.GeoDataFrame, buildings: gpd.GeoDataF
     )
 
     return buildings
+
+
+def _random_ids(n: int, length: int = 16) -> list:
+    # draw the random bytes for all ids at once instead of one uuid4 per block
+    hex_str = secrets.token_hex(n * length // 2)
+
+    return [hex_str[i : i + length] for i in range(0, n * length, length)]
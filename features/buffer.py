@@ -1,11 +1,11 @@
 from collections.abc import Iterable
+from itertools import chain
 from typing import Callable, Dict, List, Tuple, Union
 
 import numpy as np
 import pandas as pd
 import geopandas as gpd
 import h3
-import h3pandas  # noqa
 import pandas as pd
 from pyproj import Transformer
 from shapely import Point
@@ -53,13 +53,19 @@ def calculate_h3_grid_shares(gdf: gpd.GeoDataFrame, col: str, res: int, dropna:
     if dropna:
         gdf = gdf.dropna(subset=[col])
 
-    hex_grid = gdf.groupby(["h3_index", col], observed=False).size()
+    # only values present in the data become share columns, also for categoricals with unused categories
+    hex_grid = gdf.groupby(["h3_index", col], observed=True).size()
 
     return hex_grid
 
 
 def add_h3_buffer_mean_excluding_self(
-    gdf: gpd.GeoDataFrame, cols: Dict[str, str], res: int, k: Union[int, List[int]], grid_cells: pd.DataFrame = None
+    gdf: gpd.GeoDataFrame,
+    cols: Dict[str, str],
+    res: int,
+    k: Union[int, List[int]],
+    grid_cells: pd.DataFrame = None,
+    rings: Dict = None,
 ) -> gpd.GeoDataFrame:
     """
         Calculate leaf-one-out average in buffer for a GeoDataFrame based on H3 indexes.
@@ -72,32 +78,39 @@ def add_h3_buffer_mean_excluding_self(
         k:  The number of hexagonal rings to include in the buffer. Provide a list to calculate features
             for multiple buffer sizes.
         grid_cells: Optional list of H3 indexes to calculate features for.
+        rings: Optional neighborhoods of the grid cells as returned by h3_rings.
 
     Returns:
         A hexagonal grid with the calculated buffer features.
     """
     operations = {f"_{op}_{col}": (col, op) for col in cols.values() for op in ["sum", "count"]}
-    grid = calculate_h3_buffer_features(gdf, operations, res, k, grid_cells)
-    gdf = gdf.merge(grid, left_on="h3_index", right_index=True, how="left")
+    grid = calculate_h3_buffer_features(gdf, operations, res, k, grid_cells, rings)
+    # look up the sums and counts per building without merging them into (and later dropping them from) the frame
+    grid = grid.reindex(gdf["h3_index"].to_numpy())
 
+    loo_means = {}
     for col_mean, col in cols.items():
+        values = gdf[col].to_numpy(dtype=float, na_value=np.nan)
         for j in _ensure_iterable(k):
             suffix = ft_suffix(res, j)
-            sum_col = f"_sum_{col}_{suffix}"
-            count_col = f"_count_{col}_{suffix}"
-            loo_mean_col = f"{col_mean}_{suffix}"
+            sums = grid[f"_sum_{col}_{suffix}"].to_numpy()
+            counts = grid[f"_count_{col}_{suffix}"].to_numpy()
 
-            na_mask = gdf[col].isna()
-            gdf.loc[na_mask, loo_mean_col] = gdf[sum_col] / gdf[count_col]
-            gdf.loc[~na_mask, loo_mean_col] = (gdf[sum_col] - gdf[col]) / (gdf[count_col] - 1)
-            gdf.loc[gdf[count_col] <= 1, loo_mean_col] = np.nan
-            gdf = gdf.drop(columns=[sum_col, count_col])
+            with np.errstate(divide="ignore", invalid="ignore"):
+                loo_mean = np.where(np.isnan(values), sums / counts, (sums - values) / (counts - 1))
+            loo_mean[counts <= 1] = np.nan
+            loo_means[f"{col_mean}_{suffix}"] = loo_mean
 
-    return gdf
+    return pd.concat([gdf, pd.DataFrame(loo_means, index=gdf.index)], axis=1)
 
 
 def calculate_h3_buffer_features(
-    gdf: gpd.GeoDataFrame, operation: Dict[str, Tuple[str, Callable]], res: int, k: Union[int, List[int]], grid_cells: pd.DataFrame = None
+    gdf: gpd.GeoDataFrame,
+    operation: Dict[str, Tuple[str, Callable]],
+    res: int,
+    k: Union[int, List[int]],
+    grid_cells: pd.DataFrame = None,
+    rings: Dict = None,
 ) -> gpd.GeoDataFrame:
     """
     Calculate buffer features for a GeoDataFrame based on H3 indexes.
@@ -111,6 +124,7 @@ def calculate_h3_buffer_features(
         k:  The number of hexagonal rings to include in the buffer. Provide a list to calculate features
             for multiple buffer sizes.
         grid_cells: Optional list of H3 indexes to calculate features for.
+        rings: Optional neighborhoods of the grid cells as returned by h3_rings.
 
     Returns:
         A hexagonal grid with the calculated buffer features.
@@ -119,20 +133,31 @@ def calculate_h3_buffer_features(
     if grid_cells is None:
         grid_cells = grid_values
     nbh_operation = _determine_neighborhood_agg_operation(operation)
-    agg_grid = _calculate_hex_rings_aggregate(grid_cells, grid_values, nbh_operation, res, k)
+    agg_grid = _calculate_hex_rings_aggregate(grid_cells, grid_values, nbh_operation, res, k, rings)
 
     return agg_grid
 
 
 def calculate_h3_buffer_shares(
-    gdf: gpd.GeoDataFrame, col: str, h3_res: int, k: Union[int, List[int]], grid_cells: pd.DataFrame = None, dropna: bool = False, n_min: int = 1, exclude_self: bool = False
+    gdf: gpd.GeoDataFrame,
+    col: str,
+    h3_res: int,
+    k: Union[int, List[int]],
+    grid_cells: pd.DataFrame = None,
+    dropna: bool = False,
+    n_min: int = 1,
+    exclude_self: bool = False,
+    rings: Dict = None,
 ) -> gpd.GeoDataFrame:
     grid_counts = calculate_h3_grid_shares(gdf, col, h3_res, dropna)
     grid_counts = grid_counts.unstack(level=col, fill_value=0)
+    if isinstance(gdf[col].dtype, pd.CategoricalDtype):
+        grid_counts = grid_counts.reindex(columns=_present_categories(gdf[col]), fill_value=0)
     if grid_cells is None:
         grid_cells = grid_counts
-    agg_grid = _calculate_hex_rings_aggregate(grid_cells, grid_counts, "sum", h3_res, k)
-    exploded_grid = gdf[["h3_index", col]].merge(agg_grid, left_on="h3_index", right_index=True, how="left")
+    agg_grid = _calculate_hex_rings_aggregate(grid_cells, grid_counts, "sum", h3_res, k, rings)
+    exploded_grid = agg_grid.reindex(gdf["h3_index"].to_numpy()).set_axis(gdf.index)
+    exploded_grid.insert(0, col, gdf[col])
 
     ft_suffixes = [ft_suffix(h3_res, j) for j in _ensure_iterable(k)]
     for suffix in ft_suffixes:
@@ -146,7 +171,7 @@ def calculate_h3_buffer_shares(
         shares[totals < n_min] = np.nan
         exploded_grid[counts.columns] = shares
 
-    return exploded_grid.drop(columns=["h3_index", col])
+    return exploded_grid.drop(columns=col)
 
 
 def h3_index(gdf: Union[gpd.GeoSeries, gpd.GeoDataFrame], res: int) -> List[str]:
@@ -162,27 +187,51 @@ def h3_index(gdf: Union[gpd.GeoSeries, gpd.GeoDataFrame], res: int) -> List[str]
     """
     # H3 operations require a lat/lon point geometry
     centroids = gdf.centroid.to_crs("EPSG:4326")
-    lngs = centroids.x
-    lats = centroids.y
+    lngs = centroids.x.to_numpy().tolist()
+    lats = centroids.y.to_numpy().tolist()
     h3_idx = [h3.geo_to_h3(lat, lng, res) for lat, lng in zip(lats, lngs)]
 
     return h3_idx
 
 
+def h3_rings(cells: pd.Index, k: Union[int, List[int]]) -> Dict[int, Tuple[np.ndarray, List[str]]]:
+    """
+    Determine the neighboring hexagons of H3 grid cells for each buffer size.
+
+    The result can be passed to the buffer feature functions to share the H3 lookups
+    between several features calculated for the same grid cells.
+
+    Args:
+        cells: The H3 indexes of the grid cells.
+        k:  The number of hexagonal rings to include in the buffer. Provide a list to determine
+            the neighborhoods for multiple buffer sizes.
+
+    Returns:
+        A dictionary with the buffer sizes as keys and the long-form (cell position, neighbor) pairs as values.
+    """
+    return {j: _hex_ring(cells, j) for j in _ensure_iterable(k)}
+
+
 def ft_suffix(res: int, k: int = 0) -> str:
     area = _calculate_buffer_area(res, k)
     return f"within_buffer_{area:.2f}km2"
 
 
 def _calculate_hex_rings_aggregate(
-    grid_cells: pd.DataFrame, grid_values: pd.DataFrame, operation: Union[str, List, Dict, Callable], res: int, k: Union[int, List[int]]
+    grid_cells: pd.DataFrame,
+    grid_values: pd.DataFrame,
+    operation: Union[str, List, Dict, Callable],
+    res: int,
+    k: Union[int, List[int]],
+    rings: Dict = None,
 ) -> pd.DataFrame:
     aggregates = []
     hex_rings = _ensure_iterable(k)
 
     # Calculate aggregate for each hex ring size / buffer size
     for j in hex_rings:
-        ring_aggregate = _calcuate_hex_ring_aggregate(grid_cells, grid_values, operation, j)
+        ring = None if rings is None else rings[j]
+        ring_aggregate = _calcuate_hex_ring_aggregate(grid_cells, grid_values, operation, j, ring)
         ring_aggregate = ring_aggregate.add_suffix("_" + ft_suffix(res, j))
         aggregates.append(ring_aggregate)
 
@@ -190,17 +239,36 @@ def _calculate_hex_rings_aggregate(
 
 
 def _calcuate_hex_ring_aggregate(
-    grid_cells: pd.DataFrame, grid_values: pd.DataFrame, operation: Union[str, List, Dict, Callable], k: int
+    grid_cells: pd.DataFrame,
+    grid_values: pd.DataFrame,
+    operation: Union[str, List, Dict, Callable],
+    k: int,
+    ring: Tuple = None,
 ) -> pd.DataFrame:
-    # Add column with neighboring hexagons
-    neighbors = grid_cells.h3.k_ring(k=k)["h3_k_ring"]
+    # Determine the neighboring hexagons of all cells as long-form (cell, neighbor) pairs with integer positions
+    cell_pos, neighbors = _hex_ring(grid_cells.index, k) if ring is None else ring
+    neighbor_pos = grid_values.index.get_indexer(neighbors)
+
+    # Gather the neighbor values by position, neighbors without values (-1) point to a trailing all-NaN row
+    values = grid_values.to_numpy(dtype=float)
+    values = np.vstack([values, np.full((1, values.shape[1]), np.nan)])
+    ring_values = pd.DataFrame(values[neighbor_pos], columns=grid_values.columns)
 
     # Perform aggregate operation (e.g. mean) across the hexagons in the neighborhood
-    agg = neighbors.apply(lambda x: grid_values.reindex(x).agg(operation))
+    agg = ring_values.groupby(cell_pos).agg(operation)
+    agg.index = grid_cells.index
 
     return agg
 
 
+def _hex_ring(cells: pd.Index, k: int) -> Tuple[np.ndarray, List[str]]:
+    rings = [h3.k_ring(cell, k) for cell in cells]
+    cell_pos = np.repeat(np.arange(len(rings)), [len(ring) for ring in rings])
+    neighbors = list(chain.from_iterable(rings))
+
+    return cell_pos, neighbors
+
+
 def _h3_to_geo(h: str, crs: str = "EPSG:4326") -> Point:
     lat, lng = h3.h3_to_geo(h)
     transformer = Transformer.from_crs("EPSG:4326", crs, always_xy=True)
@@ -264,3 +332,9 @@ def _calculate_buffer_area(res, k):
     buffer_area = n_hex_cells * hex_areas[res]
 
     return buffer_area
+
+
+def _present_categories(values: pd.Series) -> pd.Index:
+    # the categories present in the data in category order, unused categories yield no share columns
+    categories = values.cat.categories
+    return categories[categories.isin(values.dropna().unique())].rename(values.name)
@@ -1,31 +1,152 @@
 import math
+from typing import Tuple
 
 import geopandas as gpd
 import numpy as np
 import pandas as pd
+import shapely
 
 import util
 
 
-def calculate_phi(buildings: gpd.GeoDataFrame) -> pd.Series:
-    max_dist = buildings.geometry.map(lambda g: g.centroid.hausdorff_distance(g.exterior))
-    circle_area = buildings.centroid.buffer(max_dist).area
-    return buildings.area / circle_area
+def calculate_phi(buildings: gpd.GeoDataFrame, area: np.ndarray = None, centroids: np.ndarray = None) -> pd.Series:
+    geoms = buildings.geometry.array
+    area = shapely.area(geoms) if area is None else np.asarray(area)
+    centroids = shapely.centroid(geoms) if centroids is None else np.asarray(centroids)
 
+    max_dist = shapely.hausdorff_distance(centroids, shapely.get_exterior_ring(geoms))
+    # same resolution as the GeoSeries.buffer default
+    circle_area = shapely.area(shapely.buffer(centroids, max_dist, quad_segs=16))
+    return pd.Series(area / circle_area, index=buildings.index)
 
-def calculate_touches(buildings: gpd.GeoDataFrame, id_col: str = "id", min_area: float = 0) -> pd.Series:
-    touching_pairs = gpd.sjoin(buildings, buildings[buildings.area > min_area], predicate="intersects")
-    touches = touching_pairs.groupby(f"{id_col}_left").size() - 1
-    return buildings[id_col].map(touches).fillna(0).astype(int)
 
+def intersecting_pairs(buildings: gpd.GeoDataFrame) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Query the cached spatial index once for all pairs of intersecting buildings (including self-pairs),
+    to be shared by the adjacency metrics.
+    """
+    return buildings.sindex.query(buildings.geometry.array, predicate="intersects")
 
-def calculate_norm_perimeter(buildings: gpd.GeoDataFrame) -> pd.Series:
-    return _circle_perimeter(buildings.area) / buildings.length
+
+def calculate_touches(
+    buildings: gpd.GeoDataFrame,
+    min_area: float = 0,
+    area: np.ndarray = None,
+    pairs: Tuple[np.ndarray, np.ndarray] = None,
+) -> pd.Series:
+    area = buildings.area.to_numpy() if area is None else np.asarray(area)
+    left_i, right_i = intersecting_pairs(buildings) if pairs is None else pairs
+    n_intersecting = np.bincount(left_i[area[right_i] > min_area], minlength=len(buildings))
+    touches = np.where(n_intersecting > 0, n_intersecting - 1, 0)
+    return pd.Series(touches, index=buildings.index)
+
+
+def calculate_shared_walls(buildings: gpd.GeoDataFrame, pairs: Tuple[np.ndarray, np.ndarray] = None) -> pd.Series:
+    """
+    Calculate the length of walls shared with touching buildings as defined by momepy (strict contiguity),
+    but reusing the intersecting pairs instead of querying the spatial index again.
+    """
+    geoms = np.asarray(buildings.geometry.array)
+    left_i, right_i = intersecting_pairs(buildings) if pairs is None else pairs
+    other = left_i != right_i
+    left_i, right_i = left_i[other], right_i[other]
+
+    touching = shapely.touches(geoms[left_i], geoms[right_i])
+    left_i, right_i = left_i[touching], right_i[touching]
+    wall_length = shapely.length(shapely.intersection(geoms[left_i], geoms[right_i]))
+
+    return pd.Series(np.bincount(left_i, weights=wall_length, minlength=len(geoms)), index=buildings.index)
+
+
+def calculate_rectangle_metrics(buildings: gpd.GeoDataFrame) -> pd.DataFrame:
+    """
+    Calculate elongation, equivalent rectangular index and orientation as defined by momepy,
+    but derived from a single minimum rotated rectangle per geometry instead of one per metric.
+    """
+    mrr = shapely.minimum_rotated_rectangle(buildings.geometry.array)
+    mrr_area = shapely.area(mrr)
+    mrr_perimeter = shapely.length(mrr)
+
+    sqrt = np.sqrt(np.maximum(mrr_perimeter**2 - 16 * mrr_area, 0))
+    elo1 = ((mrr_perimeter - sqrt) / 4) / ((mrr_perimeter / 2) - ((mrr_perimeter - sqrt) / 4))
+    elo2 = ((mrr_perimeter + sqrt) / 4) / ((mrr_perimeter / 2) - ((mrr_perimeter + sqrt) / 4))
+    elongation = np.where(elo1 <= elo2, elo1, elo2)
+
+    rectangularity = np.sqrt(buildings.area / mrr_area) * (mrr_perimeter / buildings.length)
+
+    coords = shapely.get_coordinates(mrr)
+    pt0 = coords[::5]
+    pt1 = coords[1::5]
+    angle = np.degrees(np.arctan2(pt1[:, 0] - pt0[:, 0], pt1[:, 1] - pt0[:, 1]))
+    orientation = np.abs((angle + 45) % 90 - 45)
+
+    return pd.DataFrame(
+        {"elongation": elongation, "rectangularity": rectangularity, "orientation": orientation},
+        index=buildings.index,
+    )
+
+
+def calculate_outline_metrics(buildings: gpd.GeoDataFrame) -> pd.DataFrame:
+    """
+    Calculate longest axis length, convexity and courtyard area as defined by momepy,
+    but on the raw geometry array with a single area computation shared by all metrics.
+    """
+    geoms = buildings.geometry.array
+    area = shapely.area(geoms)
+
+    longest_axis_length = shapely.minimum_bounding_radius(geoms) * 2
+    convexity = area / shapely.area(shapely.convex_hull(geoms))
+    courtyard_area = shapely.area(shapely.polygons(shapely.get_exterior_ring(geoms))) - area
+
+    return pd.DataFrame(
+        {"longest_axis_length": longest_axis_length, "convexity": convexity, "courtyard_area": courtyard_area},
+        index=buildings.index,
+    )
+
+
+def calculate_corners(buildings: gpd.GeoDataFrame, tolerance: float = 0.5, eps: float = 45) -> pd.Series:
+    """
+    Count the corners of the simplified exterior as defined by momepy,
+    but with a single pass over the coordinates of all geometries instead of a groupby-apply per geometry.
+    """
+    rings = shapely.get_exterior_ring(shapely.simplify(buildings.geometry.array, tolerance))
+    coords, ring_idx = shapely.get_coordinates(rings, return_index=True)
+
+    # drop the closing coordinate of each ring
+    is_open = np.append(ring_idx[1:] == ring_idx[:-1], False)
+    coords, ring_idx = coords[is_open], ring_idx[is_open]
+
+    # previous and next vertex within the same ring, wrapping around at the ring's start and end
+    n_vertices = np.bincount(ring_idx, minlength=len(rings))
+    start = (np.cumsum(n_vertices) - n_vertices)[ring_idx]
+    end = start + n_vertices[ring_idx] - 1
+    i = np.arange(len(coords))
+    ba = coords[np.where(i == start, end, i - 1)] - coords
+    bc = coords[np.where(i == end, start, i + 1)] - coords
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        cosine_angle = np.sum(ba * bc, axis=1) / (np.linalg.norm(ba, axis=1) * np.linalg.norm(bc, axis=1))
+    degrees = np.degrees(np.arccos(cosine_angle))
+    is_corner = (degrees <= 180 - eps) | (degrees >= 180 + eps)
+
+    return pd.Series(np.bincount(ring_idx[is_corner], minlength=len(rings)), index=buildings.index)
+
+
+def calculate_norm_perimeter(
+    buildings: gpd.GeoDataFrame, area: np.ndarray = None, perimeter: np.ndarray = None
+) -> pd.Series:
+    area = buildings.area if area is None else area
+    perimeter = buildings.length if perimeter is None else perimeter
+    return pd.Series(_circle_perimeter(area) / perimeter, index=buildings.index)
 
 
 def _circle_perimeter(area: pd.Series) -> pd.Series:
     return 2 * np.sqrt(area * math.pi)
 
 
-def calculate_distance_to_closest_building(buildings: gpd.GeoDataFrame, min_area: float = 0) -> pd.Series:
-    return util.distance_nearest(buildings, buildings[buildings.area > min_area], max_distance=100).fillna(100)
+def calculate_distance_to_closest_building(
+    buildings: gpd.GeoDataFrame, min_area: float = 0, area: np.ndarray = None
+) -> pd.Series:
+    area = buildings.area if area is None else area
+    candidates = buildings.geometry[np.asarray(area > min_area)]
+    return util.distance_nearest(buildings, candidates, max_distance=100, exclusive=True).fillna(100)
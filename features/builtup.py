@@ -1,3 +1,5 @@
+from typing import List
+
 import geopandas as gpd
 import numpy as np
 import pandas as pd
@@ -27,6 +29,19 @@ GHS_NDVI_CATS = {
     2: 0.4,  # medium vegetation surfaces 0.3 < NDVI <=0.5
     3: 0.75,  # high vegetation surfaces NDVI > 0.5
 }
+GHS_N_CLASSES = 26
+
+
+def _height_lut() -> np.ndarray:
+    # dense class -> height lookup table; the extra last entry catches NaN and unknown classes
+    lut = np.full(GHS_N_CLASSES + 1, np.nan)
+    for height, classes in GHS_CAT_AVG_HEIGHTS.items():
+        lut[classes] = height
+
+    return lut
+
+
+GHS_HEIGHT_LUT = _height_lut()
 
 
 def load_built_up(built_up_path: str, buildings: gpd.GeoDataFrame) -> tuple[np.ndarray, dict]:
@@ -50,39 +65,74 @@ def distance_to_ghs_class(buildings: gpd.GeoDataFrame, bu_raster: np.ndarray, bu
 
 
 def ghs_height(buildings: gpd.GeoDataFrame, bu_raster: np.ndarray, bu_meta: dict) -> pd.Series:
-    ghs_classes = util.read_values(buildings.centroid, bu_raster, bu_meta)
-    ghs_heights = ghs_classes.map(_reverse(GHS_CAT_AVG_HEIGHTS))
+    ghs_classes = util.read_values(buildings, bu_raster, bu_meta)
+    ghs_heights = pd.Series(_class_heights(ghs_classes.to_numpy()), index=ghs_classes.index)
 
     return ghs_heights.fillna(0)
 
 
 def ghs_height_pooled(buildings: gpd.GeoDataFrame, bu_raster: np.ndarray, bu_meta: dict, window_size: int) -> pd.Series:
-    mapping = _reverse(GHS_CAT_AVG_HEIGHTS)
-    height_raster = util.map_values(bu_raster, mapping)
-    ghs_heights = util.read_values_pooled(buildings.centroid, height_raster, bu_meta, window_size=window_size)
+    return ghs_heights_pooled(buildings, bu_raster, bu_meta, [window_size])[window_size]
 
-    return ghs_heights.fillna(0)
+
+def ghs_heights_pooled(
+    buildings: gpd.GeoDataFrame, bu_raster: np.ndarray, bu_meta: dict, window_sizes: List[int]
+) -> pd.DataFrame:
+    # the class to height mapping of the whole raster is done once for all window sizes
+    height_raster = _class_heights(bu_raster)
+    indices = util.raster_indices(buildings, bu_meta)
+    ghs_heights = {
+        window_size: util.read_values_pooled(buildings, height_raster, bu_meta, window_size, indices).fillna(0)
+        for window_size in window_sizes
+    }
+
+    return pd.DataFrame(ghs_heights, index=buildings.index)
 
 
 def ghs_mean_height(buildings, raster, meta, buffer_m):
-    mapping = _reverse(GHS_CAT_AVG_HEIGHTS)
-    height_raster = util.map_values(raster, mapping)
+    height_raster = _class_heights(raster)
 
-    return util.area_mean(buildings.centroid, height_raster, meta, buffer_m)
+    return util.area_mean(buildings, height_raster, meta, buffer_m)
 
 
 def ghs_mean_ndvi(buildings, raster, meta, buffer_m):
     ndvi_raster = util.map_values(raster, GHS_NDVI_CATS)
 
-    return util.area_mean(buildings.centroid, ndvi_raster, meta, buffer_m)
+    return util.area_mean(buildings, ndvi_raster, meta, buffer_m)
 
 
 def ghs_type_share(buildings, raster, meta, buffer_m, category):
     target_classes = (GHS_USE_TYPES | GHS_HEIGHT_CATS)[category]
     type_mask = np.isin(raster, target_classes).astype(np.int8)
 
-    return util.area_mean(buildings.centroid, type_mask, meta, buffer_m)
+    return util.area_mean(buildings, type_mask, meta, buffer_m)
 
 
-def _reverse(d):
-    return {value: key for key, values in d.items() for value in values}
+def ghs_buffer_means(buildings: gpd.GeoDataFrame, raster: np.ndarray, meta: dict, buffers: List[int]) -> pd.DataFrame:
+    """
+    Calculate the mean height, greenness and residential / non-residential type shares around each building
+    for several buffer sizes, remapping the built-up raster only once per feature instead of once per buffer size
+    and locating the buildings on the raster grid only once.
+    """
+    type_cats = GHS_USE_TYPES | GHS_HEIGHT_CATS
+    feature_rasters = {
+        "height": _class_heights(raster),
+        "greenness": util.map_values(raster, GHS_NDVI_CATS),
+        "type_share_residential": np.isin(raster, type_cats["residential"]).astype(np.int8),
+        "type_share_non_residential": np.isin(raster, type_cats["non-residential"]).astype(np.int8),
+    }
+    indices = util.raster_indices(buildings, meta)
+    means = {
+        f"{name}_buffer_{buffer_m}": util.area_mean(buildings, feature_raster, meta, buffer_m, indices)
+        for buffer_m in buffers
+        for name, feature_raster in feature_rasters.items()
+    }
+
+    return pd.DataFrame(means, index=buildings.index)
+
+
+def _class_heights(classes: np.ndarray) -> np.ndarray:
+    valid = (classes >= 0) & (classes < GHS_N_CLASSES)
+    idx = np.where(valid, classes, GHS_N_CLASSES).astype(np.intp)
+
+    return GHS_HEIGHT_LUT[idx]
@@ -52,11 +52,13 @@ CLC_MAPPING = [
     (44, 523, "Sea and ocean"),
 ]
 """
+from typing import List
+
 import numpy as np
 import geopandas as gpd
 import pandas as pd
 
-from util import bbox, transform_crs, read_area, distance_nearest_cell
+from util import bbox, transform_crs, read_area, distance_nearest_cell, raster_indices
 
 CORINE_CRS = "EPSG:3035"
 OCEANS_CRS = "EPSG:3857"
@@ -103,10 +105,35 @@ def distance_to_landuse(buildings: gpd.GeoDataFrame, lu_raster: np.ndarray, lu_m
     Returns:
         A Series containing the distances to the nearest land use area of the specified category.
     """
-    target_classes = CORINE_LU_MAPPING[category]
-    mask = np.isin(lu_raster, target_classes)
+    return distance_to_landuses(buildings, lu_raster, lu_meta, [category])[category]
+
+
+def distance_to_landuses(
+    buildings: gpd.GeoDataFrame, lu_raster: np.ndarray, lu_meta: dict, categories: List[str]
+) -> pd.DataFrame:
+    """
+    Compute the approximate distance (in meters) from each building to the nearest
+    land-use grid cell of each of the specified CORINE categories.
+
+    The building centroids and their raster indices are computed once and shared by all categories.
+
+    Args:
+        buildings: GeoDataFrame with building geometries
+        lu_raster: Land use raster data
+        lu_meta: Land use raster metadata
+        categories: The land use categories to calculate distances to.
+
+    Returns:
+        A DataFrame with one column of distances per land use category.
+    """
+    centroids = buildings.centroid
+    indices = raster_indices(centroids, lu_meta)
+    dis = {}
+    for category in categories:
+        mask = np.isin(lu_raster, CORINE_LU_MAPPING[category])
+        dis[category] = distance_nearest_cell(centroids, lu_raster, lu_meta, mask, indices)
 
-    return distance_nearest_cell(buildings, lu_raster, lu_meta, mask)
+    return pd.DataFrame(dis, index=buildings.index)
 
 
 def distance_to_coast(buildings: gpd.GeoDataFrame, oceans_path: str) -> pd.Series:
@@ -121,7 +148,7 @@ def distance_to_coast(buildings: gpd.GeoDataFrame, oceans_path: str) -> pd.Serie
         A Series containing the distances from each building to the nearest ocean or sea.
     """
     box = bbox(buildings, crs=OCEANS_CRS, buffer=1e6)
-    oceans = gpd.read_file(oceans_path, bbox=box)
+    oceans = gpd.read_file(oceans_path, bbox=box, engine="pyogrio", use_arrow=True)
 
     ocean_geom = oceans.union_all()
     ocean_geom = transform_crs(ocean_geom, oceans.crs, buildings.crs)
@@ -1,26 +1,69 @@
-from typing import Any
+from typing import Any, Dict, List, Tuple
 
 import geopandas as gpd
+import numpy as np
 import pandas as pd
-
-import util
+import shapely
 
 
 def closest_building(buildings: gpd.GeoDataFrame, attr: str, min_area: float = 0) -> gpd.GeoDataFrame:
-    nearest = util.snearest_attr(buildings, buildings[buildings.area > min_area], attr=attr, max_distance=50)
-    return nearest[attr]
+    return closest_buildings(buildings, [attr], min_area)[attr]
+
+
+def closest_buildings(
+    buildings: gpd.GeoDataFrame, attrs: List[str], min_area: float = 0, max_distance: float = 50
+) -> pd.DataFrame:
+    """
+    Determine the attribute values of the closest building with a known value, for each attribute.
+    Areas are computed once and the candidate subsets are indexed on the geometry array without copying the frame.
+    """
+    geoms = buildings.geometry.to_numpy()
+    large = (buildings.area > min_area).to_numpy()
+
+    values = {}
+    for attr in attrs:
+        candidates = np.flatnonzero(large & buildings[attr].notna().to_numpy())
+        left_i, right_i = shapely.STRtree(geoms[candidates]).query_nearest(
+            geoms, max_distance=max_distance, all_matches=False
+        )
+        values[attr] = pd.Series(buildings[attr].iloc[candidates[right_i]].to_numpy(), index=buildings.index[left_i])
+
+    return pd.DataFrame(values).reindex(buildings.index)
 
 
 def distance_to_building(
     buildings: gpd.GeoDataFrame, attr: str, value: Any
 ) -> pd.Series:
+    return distance_to_buildings(buildings, {"distance": (attr, value)})["distance"]
+
+
+def distance_to_buildings(
+    buildings: gpd.GeoDataFrame, specs: Dict[str, Tuple[str, Any]], max_distance: float = 1000
+) -> pd.DataFrame:
+    """
+    Calculate the distance to the closest other building matching each (attr, value) spec.
+    The geometry array is extracted once and each subset is indexed without copying any building attributes.
+    """
+    geoms = buildings.geometry.to_numpy()
+
+    dis = {}
+    for col, (attr, value) in specs.items():
+        subset = geoms[_attribute_mask(buildings[attr], value)]
+        (left_i, _), d = shapely.STRtree(subset).query_nearest(
+            geoms, max_distance=max_distance, return_distance=True, exclusive=True, all_matches=False
+        )
+        dis[col] = np.full(len(geoms), float(max_distance))
+        dis[col][left_i] = d
+
+    return pd.DataFrame(dis, index=buildings.index)
+
+
+def _attribute_mask(values: pd.Series, value: Any) -> np.ndarray:
     if isinstance(value, (list, tuple)) and isinstance(value[0], str):
-        subset = buildings[buildings[attr].isin(value)]
+        mask = values.isin(value)
     elif isinstance(value, (list, tuple)) and isinstance(value[0], (int, float)):
-        subset = buildings[buildings[attr].between(*value)]
+        mask = values.between(*value)
     else:
-        subset = buildings[buildings[attr] == value]
-
-    dis = util.distance_nearest(buildings, subset, max_distance=1000, exclusive=True)
+        mask = values == value
 
-    return dis.fillna(1000)
+    return mask.fillna(False).to_numpy(dtype=bool)
@@ -1,10 +1,14 @@
+import inspect
+import logging
 import os
-from typing import Callable, Dict, Tuple
+import shutil
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, List, Tuple
 
 import geopandas as gpd
-import momepy
 import numpy as np
 import pandas as pd
+import shapely
 
 from features import (
     address,
@@ -25,17 +29,51 @@ from log import LoggingContext, setup_logger
 from util import (
     center,
     distance_to_max,
-    extract_largest_polygon_from_multipolygon,
+    extract_largest_polygons_from_multipolygons,
     load_buildings,
+    load_stage_features,
     read_value,
+    stage_features_exist,
+    stage_fingerprint,
     store_features,
+    store_stage_features,
     transform_crs,
+    transform_points,
     sample_representative_validation_set_across_attributes,
 )
 
 H3_RES = 10
 H3_BUFFER_SIZES = [0, 1, 4]  # corresponds to a buffer of 0.02, 0.1 and 0.9 km^2
 CRS = 3035
+N_CPUS = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count()
+N_STAGE_WORKERS = min(N_CPUS, 8)  # 8 independent stages
+H3_BUFFER_SUFFIXES = {k: buffer.ft_suffix(H3_RES, k) for k in H3_BUFFER_SIZES}
+H3_LARGE_SUFFIX = buffer.ft_suffix(H3_RES - 2)
+H3_LARGE_INDEX = f"h3_{H3_RES - 2}"
+TARGET_ATTRS = ["bldg_height", "bldg_floors", "bldg_age"]  # kept at full precision when downcasting features
+KEY_COLS = ["id", "block_id"]  # string columns the stages merge and group by
+FEATURE_PREFIXES = (
+    "bldg",
+    "block",
+    "neighbors",
+    "poi",
+    "address",
+    "street",
+    "lu",
+    "ghs",
+    "nuts",
+    "satclip",
+    "cdd",
+    "hdd",
+    "elevation",
+    "ruggedness",
+    "lat",
+    "lng",
+    "country",
+    "population",
+    "distance_to_center",
+    "i_",
+)
 
 
 def execute_feature_pipeline(
@@ -63,7 +101,16 @@ def execute_feature_pipeline(
         logger.info(f"Skipping feature engineering for region {region_id} because already done.")
         return
 
+    # features of stages no later stage depends on are written to disk right away to keep the frame narrow
+    # stage files left behind by an interrupted run are reused and removed only once the region is done
+    stage_dir = os.path.join(out_dir, f"{region_id}_stages")
+
     buildings = load_buildings(bldgs_dir, region_id)
+    if buildings.empty:
+        logger.info(f"Skipping feature engineering for region {region_id} because it contains no buildings.")
+        store_features(buildings, out_dir, region_id)
+        return
+
     buildings, blocks = _preprocess(buildings)
 
     with LoggingContext(logger, feature_name="building"):
@@ -75,75 +122,100 @@ def execute_feature_pipeline(
     with LoggingContext(logger, feature_name="blocks"):
         buildings = _calculate_block_features(buildings, blocks)
 
+    # float32 is precise enough for the features and halves the memory traffic of the buffer aggregations
+    buildings = _downcast_float_features(
+        buildings, buildings.filter(regex="^(bldg|block)_").columns, keep=TARGET_ATTRS
+    )
+
     with LoggingContext(logger, feature_name="neighbors"):
         buildings = _calculate_neighbor_features(buildings)
 
     with LoggingContext(logger, feature_name="address"):
         buildings = _calculate_address_features(buildings, blocks, addresses_path)
 
-    with LoggingContext(logger, feature_name="street"):
-        buildings = _calculate_street_features(buildings, streets_dir, region_id)
-
-    with LoggingContext(logger, feature_name="poi"):
-        buildings = _calculate_poi_features(buildings, pois_dir, region_id)
-
-    with LoggingContext(logger, feature_name="landuse"):
-        buildings = _calculate_landuse_features(buildings, lu_path, oceans_path)
-
-    with LoggingContext(logger, feature_name="GHS_built_up"):
-        buildings = _calculate_GHS_built_up_features(buildings, built_up_path)
-
-    with LoggingContext(logger, feature_name="topography"):
-        buildings = _calculate_topography_features(buildings, topo_path)
-
-    with LoggingContext(logger, feature_name="climate"):
-        buildings = _calculate_climate_features(buildings, cdd_path, hdd_path)
-
     with LoggingContext(logger, feature_name="population"):
-        buildings = _calculate_population_features(buildings, pop_path)
-
-    with LoggingContext(logger, feature_name="nuts_region"):
-        buildings = _calculate_nuts_region_features(buildings, lau_path, region_id)
-
-    with LoggingContext(logger, feature_name="location_encoding"):
-        buildings = _calculate_location_encoding(buildings, lau_path, satclip_path, region_id)
-
-    with LoggingContext(logger, feature_name="buffer"):
-        buildings = _calculate_building_buffer_features(buildings)
-
-    with LoggingContext(logger, feature_name="buffer_poi"):
-        buildings = _calculate_poi_buffer_features(buildings, pois_dir, region_id)
-
-    with LoggingContext(logger, feature_name="buffer_GHS_built_up"):
-        buildings = _calculate_GHS_built_up_buffer_features(buildings, built_up_path)
-
-    with LoggingContext(logger, feature_name="buffer_population"):
-        buildings = _calculate_population_buffer_features(buildings, pop_path)
+        # the population raster is shared with the buffer stage to avoid reading it twice
+        pop_raster, pop_meta = population.load_population_raster(pop_path, buildings)
+        buildings = _calculate_population_features(buildings, pop_raster, pop_meta)
+
+    # the following stages only depend on the building geometries and external data and run concurrently,
+    # GEOS, PROJ and GDAL release the GIL for most of the work
+    stage_names = []
+    stage_bldgs = buildings[["id", "geometry", "_centroid", H3_LARGE_INDEX, "bldg_orientation"]]
+    with ThreadPoolExecutor(max_workers=N_STAGE_WORKERS) as executor:
+        # inputs shared with the buffer stages are loaded first
+        pois = executor.submit(poi.load_pois, pois_dir, region_id, CRS)
+        built_up = executor.submit(builtup.load_built_up, built_up_path, buildings)
+        stages = _submit_stages(executor, logger, stage_bldgs, stage_dir, [
+            ("street", _calculate_street_features, (streets_dir, region_id)),
+            ("landuse", _calculate_landuse_features, (lu_path, oceans_path)),
+            ("topography", _calculate_topography_features, (topo_path,)),
+            ("climate", _calculate_climate_features, (cdd_path, hdd_path)),
+            ("nuts_region", _calculate_nuts_region_features, (lau_path, region_id)),
+            ("location_encoding", _calculate_location_encoding, (lau_path, satclip_path, region_id)),
+        ])
+        pois = pois.result()
+        built_up, built_up_meta = built_up.result()
+        stages += _submit_stages(executor, logger, stage_bldgs, stage_dir, [
+            ("poi", _calculate_poi_features, (pois,)),
+            ("GHS_built_up", _calculate_GHS_built_up_features, (built_up, built_up_meta)),
+        ])
+        for stage in stages:
+            stage_names.append(stage.result())
+
+    # the auxiliary buffer stages run concurrently with the building buffer stage
+    stage_bldgs = buildings[["id", "geometry", "_centroid", "h3_index", H3_LARGE_INDEX, "population"]]
+    with ThreadPoolExecutor(max_workers=N_STAGE_WORKERS) as executor:
+        stages = _submit_stages(executor, logger, stage_bldgs, stage_dir, [
+            ("buffer_poi", _calculate_poi_buffer_features, (pois,)),
+            ("buffer_GHS_built_up", _calculate_GHS_built_up_buffer_features, (built_up, built_up_meta)),
+            ("buffer_population", _calculate_population_buffer_features, (pop_raster, pop_meta)),
+        ])
+        with LoggingContext(logger, feature_name="buffer"):
+            buildings = _calculate_building_buffer_features(buildings)
+        for stage in stages:
+            stage_names.append(stage.result())
+
+    # release the shared inputs before the stage features are joined back
+    del pois, built_up, built_up_meta, pop_raster, pop_meta
+
+    # helper columns like the h3 index at lower resolution may have been recomputed by later stages
+    stage_fts = load_stage_features(stage_dir, stage_names)
+    stage_fts = stage_fts.drop(columns=buildings.columns.intersection(stage_fts.columns))
+    buildings = buildings.join(stage_fts, on="id", validate="one_to_one")
 
     with LoggingContext(logger, feature_name="interaction"):
         buildings = _calculate_interaction_features(buildings)
 
     buildings = _postprocess(buildings)
     store_features(buildings, out_dir, region_id)
+    shutil.rmtree(stage_dir)
 
 
 def _preprocess(buildings: gpd.GeoDataFrame) -> gpd.GeoDataFrame:
+    buildings = _to_arrow_backed_strings(buildings)
     buildings = buildings.to_crs(CRS)
     buildings["h3_index"] = buffer.h3_index(buildings, H3_RES)
 
     buildings["bldg_multi_part"] = buildings.geometry.type == "MultiPolygon"
-    buildings.geometry = buildings.geometry.apply(extract_largest_polygon_from_multipolygon)
-
-    bldgs_gt_attrs = buildings[buildings["source_dataset"].str.contains("osm|gov")]
-    buildings["bldg_height"] = bldgs_gt_attrs["height"]
-    buildings["bldg_floors"] = bldgs_gt_attrs["floors"]
-    buildings["bldg_age"] = bldgs_gt_attrs["age"]
-    buildings["bldg_type"] = bldgs_gt_attrs["type"]
-    buildings["bldg_res_type"] = bldgs_gt_attrs["residential_type"]
-    buildings["bldg_msft_height"] = buildings[buildings["source_dataset"] == "msft"]["height"]
+    buildings.geometry = extract_largest_polygons_from_multipolygons(buildings.geometry)
+    buildings["_centroid"] = buildings.centroid  # private, reused by later stages and dropped before storing
+    # the coarser h3 index is shared by the ruggedness, population buffer and satclip features
+    buildings[H3_LARGE_INDEX] = buffer.h3_index(buildings["_centroid"], H3_RES - 2)
+
+    # private mask of buildings with ground truth attributes, reused when creating the validation set
+    buildings["_has_gt_attrs"] = buildings["source_dataset"].str.contains("osm|gov", na=False).to_numpy(dtype=bool)
+    buildings["bldg_height"] = buildings["height"].where(buildings["_has_gt_attrs"])
+    buildings["bldg_floors"] = buildings["floors"].where(buildings["_has_gt_attrs"])
+    buildings["bldg_age"] = buildings["age"].where(buildings["_has_gt_attrs"])
+    buildings["bldg_type"] = buildings["type"].where(buildings["_has_gt_attrs"])
+    buildings["bldg_res_type"] = buildings["residential_type"].where(buildings["_has_gt_attrs"])
+    buildings["bldg_msft_height"] = buildings["height"].where(buildings["source_dataset"] == "msft")
     buildings["bldg_msft_height"] = buildings["bldg_msft_height"].astype(float)
 
     buildings = _fill_missing_attributes_with_merged(buildings)
+    buildings["bldg_type"] = buildings["bldg_type"].astype("category")
+    buildings["bldg_res_type"] = buildings["bldg_res_type"].astype("category")
 
     if "block_id" not in buildings.columns:
         blocks = block.generate_blocks(buildings)
@@ -153,18 +225,33 @@ def _preprocess(buildings: gpd.GeoDataFrame) -> gpd.GeoDataFrame:
     return buildings, blocks
 
 
-def _fill_missing_attributes_with_merged(buildings: gpd.GeoDataFrame) -> None:
+def _to_arrow_backed_strings(buildings: gpd.GeoDataFrame) -> gpd.GeoDataFrame:
+    """
+    Store the string id columns, which the subsequent stages merge and group by, as Arrow-backed columns
+    instead of Python objects to reduce memory and speed up the merges / groupbys.
+    The attribute columns stay object columns, so that masking them keeps None / NaN as missing values.
+    """
+    key_cols = [
+        col for col in KEY_COLS
+        if col in buildings.columns and pd.api.types.infer_dtype(buildings[col], skipna=True) == "string"
+    ]
+    buildings[key_cols] = buildings[key_cols].astype("string[pyarrow]")
+
+    return buildings
+
+
+def _fill_missing_attributes_with_merged(buildings: gpd.GeoDataFrame) -> gpd.GeoDataFrame:
     if "osm_height_merged" in buildings.columns:
-        buildings["bldg_height"] = buildings["bldg_height"].fillna(
-            buildings[buildings["osm_height_confidence"] > 0.2]["osm_height_merged"])
-        buildings["bldg_floors"] = buildings["bldg_floors"].fillna(
-            buildings[buildings["osm_floors_confidence"] > 0.2]["osm_floors_merged"])
-        buildings["bldg_age"] = buildings["bldg_age"].fillna(
-            buildings[buildings["osm_age_confidence"] > 0.2]["osm_age_merged"])
-        buildings["bldg_type"] = buildings["bldg_type"].fillna(
-            buildings[buildings["osm_type_confidence"] > 0.2]["osm_type_merged"])
-        buildings["bldg_res_type"] = buildings["bldg_res_type"].fillna(
-            buildings[buildings["osm_residential_type_confidence"] > 0.2]["osm_residential_type_merged"])
+        # mask the merged column only instead of selecting the confident rows of the whole frame
+        for attr, osm_attr in [
+            ("bldg_height", "osm_height"),
+            ("bldg_floors", "osm_floors"),
+            ("bldg_age", "osm_age"),
+            ("bldg_type", "osm_type"),
+            ("bldg_res_type", "osm_residential_type"),
+        ]:
+            confident = buildings[f"{osm_attr}_confidence"] > 0.2
+            buildings[attr] = buildings[attr].fillna(buildings[f"{osm_attr}_merged"].where(confident))
 
     if "msft_height_merged" in buildings.columns:
         buildings["bldg_msft_height"] = buildings["bldg_msft_height"].fillna(buildings["msft_height_merged"])
@@ -190,73 +277,103 @@ def _create_validation_set_and_mask_target_attributes(buildings: gpd.GeoDataFram
         "bldg_touches_medium",
         "bldg_distance_closest_medium",
     ]
-    bldgs_w_gt_attrs = buildings[buildings["source_dataset"].str.contains("osm|gov")]
+    bldgs_w_gt_attrs = buildings[buildings["_has_gt_attrs"]]
     val_mask_gt = sample_representative_validation_set_across_attributes(bldgs_w_gt_attrs, ["height", "floors", "type"], bldg_attrs, val_size=0.2)
     val_mask = buildings.index.isin(bldgs_w_gt_attrs.index[val_mask_gt])
 
     buildings["validation"] = val_mask
-    buildings.loc[val_mask, "bldg_height"] = np.nan
-    buildings.loc[val_mask, "bldg_floors"] = np.nan
-    buildings.loc[val_mask, "bldg_age"] = np.nan
-    buildings.loc[val_mask, "bldg_type"] = np.nan
-    buildings.loc[val_mask, "bldg_res_type"] = np.nan
+    buildings.loc[val_mask, ["bldg_height", "bldg_floors", "bldg_age", "bldg_type", "bldg_res_type"]] = np.nan
 
     return buildings
 
 
 def _calculate_building_features(buildings: gpd.GeoDataFrame) -> gpd.GeoDataFrame:
-    buildings["bldg_footprint_area"] = buildings.area
-    buildings["bldg_perimeter"] = buildings.length
-    buildings["bldg_normalized_perimeter_index"] = building.calculate_norm_perimeter(buildings)
-    buildings["bldg_area_perimeter_ratio"] = buildings["bldg_footprint_area"] / buildings["bldg_perimeter"]
-    buildings["bldg_phi"] = building.calculate_phi(buildings)
-    buildings["bldg_longest_axis_length"] = momepy.longest_axis_length(buildings)
-    buildings["bldg_elongation"] = momepy.elongation(buildings)
-    buildings["bldg_convexity"] = momepy.convexity(buildings)
-    buildings["bldg_rectangularity"] = momepy.equivalent_rectangular_index(buildings)
-    buildings["bldg_orientation"] = momepy.orientation(buildings)
-    buildings["bldg_corners"] = momepy.corners(buildings.simplify(0.5), eps=45)
-    buildings["bldg_corners_area_ratio"] = buildings["bldg_corners"] / buildings["bldg_footprint_area"]
-    buildings["bldg_shared_wall_length"] = momepy.shared_walls(buildings)
-    buildings["bldg_rel_courtyard_size"] = momepy.courtyard_area(buildings) / buildings["bldg_footprint_area"]
-    buildings["bldg_distance_closest"] = building.calculate_distance_to_closest_building(buildings)
-    buildings["bldg_distance_closest_medium"] = building.calculate_distance_to_closest_building(buildings, min_area=80)
-    buildings["bldg_distance_closest_large"] = building.calculate_distance_to_closest_building(buildings, min_area=1000)
-    buildings["bldg_touches"] = building.calculate_touches(buildings)
-    buildings["bldg_touches_medium"] = building.calculate_touches(buildings, min_area=80)
-    buildings["bldg_touches_small"] = buildings["bldg_touches"] - buildings["bldg_touches_medium"]
+    # collect all features first and add them in a single concat to avoid growing the frame column by column
+    fts = {}
+    geoms = buildings.geometry.values
+    fts["bldg_footprint_area"] = shapely.area(geoms)
+    fts["bldg_perimeter"] = shapely.length(geoms)
+    fts["bldg_normalized_perimeter_index"] = building.calculate_norm_perimeter(
+        buildings, area=fts["bldg_footprint_area"], perimeter=fts["bldg_perimeter"]
+    )
+    fts["bldg_area_perimeter_ratio"] = fts["bldg_footprint_area"] / fts["bldg_perimeter"]
+    fts["bldg_phi"] = building.calculate_phi(
+        buildings, area=fts["bldg_footprint_area"], centroids=buildings["_centroid"].array
+    )
+    rect_fts = building.calculate_rectangle_metrics(buildings)
+    outline_fts = building.calculate_outline_metrics(buildings)
+    fts["bldg_longest_axis_length"] = outline_fts["longest_axis_length"]
+    fts["bldg_elongation"] = rect_fts["elongation"]
+    fts["bldg_convexity"] = outline_fts["convexity"]
+    fts["bldg_rectangularity"] = rect_fts["rectangularity"]
+    fts["bldg_orientation"] = rect_fts["orientation"]
+
+    # the intersecting pairs are shared by the adjacency metrics instead of querying the spatial index for each
+    pairs = building.intersecting_pairs(buildings)
+
+    # the vectorized shapely and numpy operations release the GIL, so these independent metrics can run concurrently
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        corners = executor.submit(building.calculate_corners, buildings)
+        shared_walls = executor.submit(building.calculate_shared_walls, buildings, pairs)
+
+    fts["bldg_corners"] = corners.result()
+    fts["bldg_corners_area_ratio"] = fts["bldg_corners"] / fts["bldg_footprint_area"]
+    fts["bldg_shared_wall_length"] = shared_walls.result()
+    fts["bldg_rel_courtyard_size"] = outline_fts["courtyard_area"] / fts["bldg_footprint_area"]
+
+    fts["bldg_distance_closest"] = building.calculate_distance_to_closest_building(
+        buildings, area=fts["bldg_footprint_area"]
+    )
+    fts["bldg_distance_closest_medium"] = building.calculate_distance_to_closest_building(
+        buildings, min_area=80, area=fts["bldg_footprint_area"]
+    )
+    fts["bldg_distance_closest_large"] = building.calculate_distance_to_closest_building(
+        buildings, min_area=1000, area=fts["bldg_footprint_area"]
+    )
+    fts["bldg_touches"] = building.calculate_touches(buildings, area=fts["bldg_footprint_area"], pairs=pairs)
+    fts["bldg_touches_medium"] = building.calculate_touches(
+        buildings, min_area=80, area=fts["bldg_footprint_area"], pairs=pairs
+    )
+    fts["bldg_touches_small"] = fts["bldg_touches"] - fts["bldg_touches_medium"]
+
+    buildings = pd.concat([buildings, pd.DataFrame(fts, index=buildings.index)], axis=1)
 
     return buildings
 
 
 def _calculate_block_features(buildings: gpd.GeoDataFrame, blocks: gpd.GeoDataFrame) -> gpd.GeoDataFrame:
     blocks = blocks.copy()
-    blocks["block_length"] = blocks["building_ids"].apply(len)
-    blocks["block_footprint_area"] = blocks.area
-    blocks["block_perimeter"] = blocks.length
-    blocks["block_normalized_perimeter_index"] = building.calculate_norm_perimeter(blocks)
+    blocks["block_length"] = blocks["building_ids"].str.len()
+    blocks["block_footprint_area"] = shapely.area(blocks.geometry.values)
+    blocks["block_perimeter"] = shapely.length(blocks.geometry.values)
+    blocks["block_normalized_perimeter_index"] = building.calculate_norm_perimeter(
+        blocks, area=blocks["block_footprint_area"], perimeter=blocks["block_perimeter"]
+    )
     blocks["block_area_perimeter_ratio"] = blocks["block_footprint_area"] / blocks["block_perimeter"]
-    blocks["block_phi"] = building.calculate_phi(blocks)
-    blocks["block_longest_axis_length"] = momepy.longest_axis_length(blocks)
-    blocks["block_elongation"] = momepy.elongation(blocks)
-    blocks["block_convexity"] = momepy.convexity(blocks)
-    blocks["block_rectangularity"] = momepy.equivalent_rectangular_index(blocks)
-    blocks["block_orientation"] = momepy.orientation(blocks)
-    blocks["block_corners"] = momepy.corners(blocks.simplify(0.5), eps=45)
+    blocks["block_phi"] = building.calculate_phi(blocks, area=blocks["block_footprint_area"])
+    rect_fts = building.calculate_rectangle_metrics(blocks)
+    outline_fts = building.calculate_outline_metrics(blocks)
+    blocks["block_longest_axis_length"] = outline_fts["longest_axis_length"]
+    blocks["block_elongation"] = rect_fts["elongation"]
+    blocks["block_convexity"] = outline_fts["convexity"]
+    blocks["block_rectangularity"] = rect_fts["rectangularity"]
+    blocks["block_orientation"] = rect_fts["orientation"]
+    blocks["block_corners"] = building.calculate_corners(blocks)
     blocks["block_corners_area_ratio"] = blocks["block_corners"] / blocks["block_footprint_area"]
-    blocks["block_rel_courtyard_size"] = momepy.courtyard_area(blocks) / blocks["block_footprint_area"]
-    blocks["block_distance_closest"] = building.calculate_distance_to_closest_building(blocks)
+    blocks["block_rel_courtyard_size"] = outline_fts["courtyard_area"] / blocks["block_footprint_area"]
+    blocks["block_distance_closest"] = building.calculate_distance_to_closest_building(
+        blocks, area=blocks["block_footprint_area"]
+    )
 
     buildings = block.merge_blocks_and_buildings(blocks, buildings)
 
-    buildings["block_avg_footprint_area"] = buildings.groupby("block_id")["bldg_footprint_area"].transform("mean")
-    buildings["block_std_footprint_area"] = buildings.groupby("block_id")["bldg_footprint_area"].transform("std")
-    buildings["block_avg_perimeter"] = buildings.groupby("block_id")["bldg_perimeter"].transform("mean")
-    buildings["block_std_perimeter"] = buildings.groupby("block_id")["bldg_perimeter"].transform("std")
-    buildings["block_avg_elongation"] = buildings.groupby("block_id")["bldg_elongation"].transform("mean")
-    buildings["block_std_elongation"] = buildings.groupby("block_id")["bldg_elongation"].transform("std")
-    buildings["block_avg_orientation"] = buildings.groupby("block_id")["bldg_orientation"].transform("mean")
-    buildings["block_std_orientation"] = buildings.groupby("block_id")["bldg_orientation"].transform("std")
+    block_agg_fts = ["footprint_area", "perimeter", "elongation", "orientation"]
+    block_bldgs = buildings.groupby("block_id")[[f"bldg_{ft}" for ft in block_agg_fts]]
+    block_avg = block_bldgs.transform("mean")
+    block_std = block_bldgs.transform("std")
+    for ft in block_agg_fts:
+        buildings[f"block_avg_{ft}"] = block_avg[f"bldg_{ft}"]
+        buildings[f"block_std_{ft}"] = block_std[f"bldg_{ft}"]
 
     buildings["block_diff_footprint_area"] = buildings["block_avg_footprint_area"] - buildings["bldg_footprint_area"]
     buildings["block_diff_std_footprint_area"] = buildings["block_diff_footprint_area"] / buildings["block_std_footprint_area"]
@@ -273,40 +390,61 @@ def _calculate_block_features(buildings: gpd.GeoDataFrame, blocks: gpd.GeoDataFr
 
 
 def _calculate_neighbor_features(buildings: gpd.GeoDataFrame) -> gpd.GeoDataFrame:
-    buildings["neighbors_distance_public"] = neighbors.distance_to_building(buildings, "bldg_type", "public")
-    buildings["neighbors_distance_industrial"] = neighbors.distance_to_building(buildings, "bldg_type", "industrial")
-    buildings["neighbors_distance_commercial"] = neighbors.distance_to_building(buildings, "bldg_type", "commercial")
-    buildings["neighbors_distance_agriculture"] = neighbors.distance_to_building(buildings, "bldg_type", "agricultural")
-    buildings["neighbors_distance_residential"] = neighbors.distance_to_building(buildings, "bldg_type", "residential")
-    buildings["neighbors_distance_residential_AB"] = neighbors.distance_to_building(buildings, "bldg_res_type", "apartment block")
-    buildings["neighbors_distance_residential_SFH"] = neighbors.distance_to_building(buildings, "bldg_res_type", "detached single-family house")
-    buildings["neighbors_distance_residential_TH"] = neighbors.distance_to_building(buildings, "bldg_res_type", "terraced house")
-    buildings["neighbors_distance_residential_DH"] = neighbors.distance_to_building(buildings, "bldg_res_type", "semi-detached duplex house")
-    buildings["neighbors_distance_non_residential"] = buildings[["neighbors_distance_public", "neighbors_distance_industrial", "neighbors_distance_commercial", "neighbors_distance_agriculture"]].min(axis=1)
-
-    buildings["neighbors_closest_building_height"] = neighbors.closest_building(buildings, "bldg_height", min_area=80)
-    buildings["neighbors_distance_low_rise"] = neighbors.distance_to_building(buildings, "bldg_height", [0, 10])
-    buildings["neighbors_distance_low_medium_rise"] = neighbors.distance_to_building(buildings, "bldg_height", [10, 20])
-    buildings["neighbors_distance_medium_rise"] = neighbors.distance_to_building(buildings, "bldg_height", [20, 30])
-    buildings["neighbors_distance_high_rise"] = neighbors.distance_to_building(buildings, "bldg_height", [30, np.inf])
-
-    buildings["neighbors_closest_building_floors"] = neighbors.closest_building(buildings, "bldg_floors", min_area=80)
-    buildings["neighbors_distance_low_rise_floors"] = neighbors.distance_to_building(buildings, "bldg_floors", [0, 3])
-    buildings["neighbors_distance_low_medium_rise_floors"] = neighbors.distance_to_building(buildings, "bldg_floors", [3.5, 6])
-    buildings["neighbors_distance_medium_rise_floors"] = neighbors.distance_to_building(buildings, "bldg_floors", [6.5, 10])
-    buildings["neighbors_distance_high_rise_floors"] = neighbors.distance_to_building(buildings, "bldg_floors", [10.5, np.inf])
-
-    buildings["neighbors_closest_msft_height"] = neighbors.closest_building(buildings, "bldg_msft_height", min_area=80)
-    buildings["neighbors_distance_msft_low_rise"] = neighbors.distance_to_building(buildings, "bldg_msft_height", [0, 10])
-    buildings["neighbors_distance_msft_low_medium_rise"] = neighbors.distance_to_building(buildings, "bldg_msft_height", [10, 20])
-    buildings["neighbors_distance_msft_medium_rise"] = neighbors.distance_to_building(buildings, "bldg_msft_height", [20, 30])
-    buildings["neighbors_distance_msft_high_rise"] = neighbors.distance_to_building(buildings, "bldg_msft_height", [30, np.inf])
-
-    buildings["neighbors_closest_building_age"] = neighbors.closest_building(buildings, "bldg_age", min_area=80)
-    buildings["neighbors_distance_prior_1900"] = neighbors.distance_to_building(buildings, "bldg_age", [0, 1900])
-    buildings["neighbors_distance_1900_1970"] = neighbors.distance_to_building(buildings, "bldg_age", [1900, 1970])
-    buildings["neighbors_distance_1970_2000"] = neighbors.distance_to_building(buildings, "bldg_age", [1970, 2000])
-    buildings["neighbors_distance_after_2000"] = neighbors.distance_to_building(buildings, "bldg_age", [2000, np.inf])
+    buildings = buildings.join(neighbors.distance_to_buildings(buildings, {
+        "neighbors_distance_public": ("bldg_type", "public"),
+        "neighbors_distance_industrial": ("bldg_type", "industrial"),
+        "neighbors_distance_commercial": ("bldg_type", "commercial"),
+        "neighbors_distance_agriculture": ("bldg_type", "agricultural"),
+        "neighbors_distance_residential": ("bldg_type", "residential"),
+        "neighbors_distance_residential_AB": ("bldg_res_type", "apartment block"),
+        "neighbors_distance_residential_SFH": ("bldg_res_type", "detached single-family house"),
+        "neighbors_distance_residential_TH": ("bldg_res_type", "terraced house"),
+        "neighbors_distance_residential_DH": ("bldg_res_type", "semi-detached duplex house"),
+    }))
+    non_residential_cols = [
+        "neighbors_distance_public",
+        "neighbors_distance_industrial",
+        "neighbors_distance_commercial",
+        "neighbors_distance_agriculture",
+    ]
+    non_residential_distances = [buildings[c].to_numpy() for c in non_residential_cols]
+    buildings["neighbors_distance_non_residential"] = np.fmin.reduce(non_residential_distances)
+
+    closest = neighbors.closest_buildings(
+        buildings, ["bldg_height", "bldg_floors", "bldg_msft_height", "bldg_age"], min_area=80
+    )
+
+    buildings["neighbors_closest_building_height"] = closest["bldg_height"]
+    buildings = buildings.join(neighbors.distance_to_buildings(buildings, {
+        "neighbors_distance_low_rise": ("bldg_height", [0, 10]),
+        "neighbors_distance_low_medium_rise": ("bldg_height", [10, 20]),
+        "neighbors_distance_medium_rise": ("bldg_height", [20, 30]),
+        "neighbors_distance_high_rise": ("bldg_height", [30, np.inf]),
+    }))
+
+    buildings["neighbors_closest_building_floors"] = closest["bldg_floors"]
+    buildings = buildings.join(neighbors.distance_to_buildings(buildings, {
+        "neighbors_distance_low_rise_floors": ("bldg_floors", [0, 3]),
+        "neighbors_distance_low_medium_rise_floors": ("bldg_floors", [3.5, 6]),
+        "neighbors_distance_medium_rise_floors": ("bldg_floors", [6.5, 10]),
+        "neighbors_distance_high_rise_floors": ("bldg_floors", [10.5, np.inf]),
+    }))
+
+    buildings["neighbors_closest_msft_height"] = closest["bldg_msft_height"]
+    buildings = buildings.join(neighbors.distance_to_buildings(buildings, {
+        "neighbors_distance_msft_low_rise": ("bldg_msft_height", [0, 10]),
+        "neighbors_distance_msft_low_medium_rise": ("bldg_msft_height", [10, 20]),
+        "neighbors_distance_msft_medium_rise": ("bldg_msft_height", [20, 30]),
+        "neighbors_distance_msft_high_rise": ("bldg_msft_height", [30, np.inf]),
+    }))
+
+    buildings["neighbors_closest_building_age"] = closest["bldg_age"]
+    buildings = buildings.join(neighbors.distance_to_buildings(buildings, {
+        "neighbors_distance_prior_1900": ("bldg_age", [0, 1900]),
+        "neighbors_distance_1900_1970": ("bldg_age", [1900, 1970]),
+        "neighbors_distance_1970_2000": ("bldg_age", [1970, 2000]),
+        "neighbors_distance_after_2000": ("bldg_age", [2000, np.inf]),
+    }))
 
     return buildings
 
@@ -315,16 +453,20 @@ def _calculate_address_features(buildings: gpd.GeoDataFrame, blocks: gpd.GeoData
     addresses = address.load_addresses(addresses_path, buildings)
 
     blocks = blocks.copy()
-    blocks["address_count_block"] = address.building_address_count(blocks, addresses)
-    blocks["address_unit_count_block"] = address.building_address_unit_count(blocks, addresses)
-    blocks["address_avg_count_block"] = blocks["address_count_block"] / blocks["building_ids"].apply(len)
-    blocks["address_avg_unit_count_block"] = blocks["address_unit_count_block"] / blocks["building_ids"].apply(len)
+    block_counts = address.building_address_counts(blocks, addresses)
+    blocks["address_count_block"] = block_counts["count"]
+    blocks["address_unit_count_block"] = block_counts["unit_count"]
+    blocks["address_avg_count_block"] = blocks["address_count_block"] / blocks["building_ids"].str.len()
+    blocks["address_avg_unit_count_block"] = blocks["address_unit_count_block"] / blocks["building_ids"].str.len()
 
     buildings = block.merge_blocks_and_buildings(blocks, buildings)
 
-    buildings["address_count"] = address.building_address_count(buildings, addresses)
-    buildings["address_unit_count"] = address.building_address_unit_count(buildings, addresses)
-    buildings["address_distance"] = address.distance_to_closest_address(buildings, addresses)
+    bldg_counts = address.building_address_counts(buildings, addresses)
+    buildings["address_count"] = bldg_counts["count"]
+    buildings["address_unit_count"] = bldg_counts["unit_count"]
+    buildings["address_distance"] = address.distance_to_closest_address(
+        buildings, addresses, centroids=buildings["_centroid"]
+    )
 
     buildings["address_diff_count_block"] = buildings["address_avg_count_block"] - buildings["address_count"]
     buildings["address_diff_unit_count_block"] = buildings["address_avg_unit_count_block"] - buildings["address_unit_count"]
@@ -342,13 +484,12 @@ def _calculate_street_features(buildings: gpd.GeoDataFrame, streets_dir: str, re
     return buildings
 
 
-def _calculate_poi_features(buildings: gpd.GeoDataFrame, pois_dir: str, region_id: str) -> gpd.GeoDataFrame:
-    pois = poi.load_pois(pois_dir, region_id, CRS)
-
-    buildings["poi_distance_commercial"] = poi.distance_to_closest_poi(buildings, pois, category="commercial")
-    buildings["poi_distance_industrial"] = poi.distance_to_closest_poi(buildings, pois, category="industrial")
-    buildings["poi_distance_education"] = poi.distance_to_closest_poi(buildings, pois, category="education")
-    buildings["poi_distance_non_residential"] = buildings[["poi_distance_commercial", "poi_distance_industrial", "poi_distance_education"]].min(axis=1)
+def _calculate_poi_features(buildings: gpd.GeoDataFrame, pois: gpd.GeoDataFrame) -> gpd.GeoDataFrame:
+    poi_distances = poi.distance_to_closest_pois(
+        buildings, pois, ["commercial", "industrial", "education"], centroids=buildings["_centroid"]
+    )
+    buildings = buildings.join(poi_distances.add_prefix("poi_distance_"))
+    buildings["poi_distance_non_residential"] = np.fmin.reduce(poi_distances.to_numpy(), axis=1)
 
     return buildings
 
@@ -356,33 +497,36 @@ def _calculate_poi_features(buildings: gpd.GeoDataFrame, pois_dir: str, region_i
 def _calculate_landuse_features(buildings: gpd.GeoDataFrame, lu_path: str, oceans_path: str) -> gpd.GeoDataFrame:
     lu, meta = landuse.load_landuse(lu_path, buildings)
 
-    buildings["lu_distance_industrial"] = landuse.distance_to_landuse(buildings, lu, meta, "industrial")
-    buildings["lu_distance_agriculture"] = landuse.distance_to_landuse(buildings, lu, meta, "agricultural")
-    buildings["lu_distance_dense_urban"] = landuse.distance_to_landuse(buildings, lu, meta, "dense_urban")
+    lu_dis = landuse.distance_to_landuses(buildings, lu, meta, ["industrial", "agricultural", "dense_urban"])
+    buildings["lu_distance_industrial"] = lu_dis["industrial"]
+    buildings["lu_distance_agriculture"] = lu_dis["agricultural"]
+    buildings["lu_distance_dense_urban"] = lu_dis["dense_urban"]
     buildings["lu_distance_coast"] = landuse.distance_to_coast(buildings, oceans_path)
 
     return buildings
 
 
-def _calculate_GHS_built_up_features(buildings: gpd.GeoDataFrame, built_up_file: str) -> gpd.GeoDataFrame:
-    built_up, meta = builtup.load_built_up(built_up_file, buildings)
-
-    bldg_centroids = buildings.centroid
+def _calculate_GHS_built_up_features(
+    buildings: gpd.GeoDataFrame, built_up: np.ndarray, meta: dict
+) -> gpd.GeoDataFrame:
+    bldg_centroids = buildings["_centroid"].to_crs(meta["crs"])
     buildings["ghs_distance_residential"] = builtup.distance_to_ghs_class(bldg_centroids, built_up, meta, "residential")
     buildings["ghs_distance_non_residential"] = builtup.distance_to_ghs_class(bldg_centroids, built_up, meta, "non-residential")
     buildings["ghs_distance_high_rise"] = builtup.distance_to_ghs_class(bldg_centroids, built_up, meta, "high-rise")
     buildings["ghs_closest_height"] = builtup.ghs_height(bldg_centroids, built_up, meta)
-    buildings["ghs_closest_height_pooled_3"] = builtup.ghs_height_pooled(bldg_centroids, built_up, meta, window_size=3)
-    buildings["ghs_closest_height_pooled_5"] = builtup.ghs_height_pooled(bldg_centroids, built_up, meta, window_size=5)
-    buildings["ghs_closest_height_pooled_10"] = builtup.ghs_height_pooled(bldg_centroids, built_up, meta, window_size=10)
+    pooled_heights = builtup.ghs_heights_pooled(bldg_centroids, built_up, meta, window_sizes=[3, 5, 10])
+    buildings["ghs_closest_height_pooled_3"] = pooled_heights[3]
+    buildings["ghs_closest_height_pooled_5"] = pooled_heights[5]
+    buildings["ghs_closest_height_pooled_10"] = pooled_heights[10]
 
     return buildings
 
 
 def _calculate_topography_features(buildings: gpd.GeoDataFrame, topo_file: str) -> gpd.GeoDataFrame:
-    elevation = topography.load_elevation(topo_file, buildings)
+    elevation_raster, elevation_meta = topography.load_elevation_raster(topo_file, buildings)
+    elevation = topography.load_elevation(elevation_raster, elevation_meta, buildings.crs)
 
-    buildings["elevation"] = topography.calculate_elevation(buildings, elevation)
+    buildings["elevation"] = topography.calculate_elevation(buildings["_centroid"], elevation_raster, elevation_meta)
     buildings["ruggedness"] = topography.calculate_ruggedness(buildings, elevation, H3_RES - 2)
 
     return buildings
@@ -399,8 +543,10 @@ def _calculate_climate_features(buildings: gpd.GeoDataFrame, cdd_file: str, hdd_
     return buildings
 
 
-def _calculate_population_features(buildings: gpd.GeoDataFrame, pop_file: str) -> gpd.GeoDataFrame:
-    buildings["population"] = population.count_local_population(buildings, pop_file)
+def _calculate_population_features(
+    buildings: gpd.GeoDataFrame, pop_raster: np.ndarray, pop_meta: dict
+) -> gpd.GeoDataFrame:
+    buildings["population"] = population.count_local_population(buildings["_centroid"], pop_raster, pop_meta)
 
     return buildings
 
@@ -413,13 +559,15 @@ def _calculate_nuts_region_features(buildings: gpd.GeoDataFrame, lau_path: str,
     nuts = region.load_nuts_attr(lau_path)
 
     region_attr = nuts.loc[region_id]
-    buildings["nuts_mountain_type"] = str(region_attr["MOUNT_TYPE"])
-    buildings["nuts_coast_type"] = str(region_attr["COAST_TYPE"])
-    buildings["nuts_urban_type"] = str(region_attr["URBN_TYPE"])
-
-    buildings["nuts_mountain_type"] = pd.Categorical(buildings["nuts_mountain_type"], categories=["1", "2", "3", "4"])
-    buildings["nuts_coast_type"] = pd.Categorical(buildings["nuts_coast_type"], categories=["1", "2", "3"])
-    buildings["nuts_urban_type"] = pd.Categorical(buildings["nuts_urban_type"], categories=["1", "2", "3"])
+    buildings["nuts_mountain_type"] = _broadcast_categorical(
+        str(region_attr["MOUNT_TYPE"]), ["1", "2", "3", "4"], len(buildings)
+    )
+    buildings["nuts_coast_type"] = _broadcast_categorical(
+        str(region_attr["COAST_TYPE"]), ["1", "2", "3"], len(buildings)
+    )
+    buildings["nuts_urban_type"] = _broadcast_categorical(
+        str(region_attr["URBN_TYPE"]), ["1", "2", "3"], len(buildings)
+    )
 
     return buildings
 
@@ -428,9 +576,9 @@ def _calculate_location_encoding(buildings: gpd.GeoDataFrame, lau_path: str, sat
     nuts = region.load_nuts_attr(lau_path)
 
     buildings = region.add_country(buildings, nuts, region_id)
+    buildings["h3_08"] = buildings[H3_LARGE_INDEX]  # the satclip embeddings are indexed at the same resolution
     buildings = satclip.add_h3_embeddings(buildings, satclip_path)
-    buildings["lng"] = buildings.centroid.to_crs("EPSG:4326").x
-    buildings["lat"] = buildings.centroid.to_crs("EPSG:4326").y
+    buildings["lng"], buildings["lat"] = transform_points(buildings["_centroid"], "EPSG:4326")
 
     return buildings
 
@@ -489,111 +637,194 @@ def _calculate_building_buffer_features(buildings: gpd.GeoDataFrame) -> gpd.GeoD
         "address_avg_unit_count": ("address_unit_count", "mean"),
         "address_std_unit_count": ("address_unit_count", "std"),
     }
-    buildings = _add_h3_buffer_features(buildings, buildings, buffer_fts)
+    # the neighborhoods of the grid cells are looked up once and shared by all building buffer features
+    h3_cells = pd.DataFrame(index=pd.unique(buildings["h3_index"]))
+    h3_rings = buffer.h3_rings(h3_cells.index, H3_BUFFER_SIZES)
+    buildings = _add_h3_buffer_features(buildings, buildings, buffer_fts, h3_rings)
 
-    h3_cells = pd.DataFrame(index=buildings["h3_index"].unique())
     target_var_buffer_fts = {"bldg_avg_height": "bldg_height", "bldg_avg_floors": "bldg_floors", "bldg_avg_age": "bldg_age"}
-    buildings = buffer.add_h3_buffer_mean_excluding_self(buildings, target_var_buffer_fts, H3_RES, H3_BUFFER_SIZES, grid_cells=h3_cells)
-
-    for s in H3_BUFFER_SIZES:
-        suffix = buffer.ft_suffix(H3_RES, s)
-        for cat, ft in [
-            ("bldg", "age"),
-            ("bldg", "height"),
-            ("bldg", "floors"),
-            ("bldg", "msft_height"),
-            ("bldg", "footprint_area"),
-            ("bldg", "perimeter"),
-            ("bldg", "area_perimeter_ratio"),
-            ("bldg", "elongation"),
-            ("bldg", "convexity"),
-            ("bldg", "orientation"),
-            ("bldg", "distance_closest"),
-            ("bldg", "touches"),
-            ("block", "footprint_area"),
-            ("block", "perimeter"),
-            ("block", "area_perimeter_ratio"),
-            ("block", "elongation"),
-            ("block", "length"),
-            ("address", "count"),
-            ("address", "unit_count"),
-        ]:
-            buildings[f"{cat}_diff_{ft}_{suffix}"] = buildings[f"{cat}_avg_{ft}_{suffix}"] - buildings[f"{cat}_{ft}"]
-            buildings[f"{cat}_diff_std_{ft}_{suffix}"] = (buildings[f"{cat}_diff_{ft}_{suffix}"] / buildings[f"{cat}_std_{ft}_{suffix}"]).replace([np.inf, -np.inf], 0)
-
-        buildings[f"bldg_diff_std_shape_{suffix}"] = buildings[[f"bldg_diff_std_{ft}_{suffix}" for ft in ["footprint_area", "perimeter", "elongation", "convexity", "orientation", "distance_closest"]]].abs().mean(axis=1)
+    buildings = buffer.add_h3_buffer_mean_excluding_self(
+        buildings, target_var_buffer_fts, H3_RES, H3_BUFFER_SIZES, grid_cells=h3_cells, rings=h3_rings
+    )
 
-    hex_grid_type_shares = buffer.calculate_h3_buffer_shares(buildings, "bldg_type", H3_RES, H3_BUFFER_SIZES, h3_cells, dropna=True, n_min=4, exclude_self=True)
+    diff_fts = [
+        ("bldg", "age"),
+        ("bldg", "height"),
+        ("bldg", "floors"),
+        ("bldg", "msft_height"),
+        ("bldg", "footprint_area"),
+        ("bldg", "perimeter"),
+        ("bldg", "area_perimeter_ratio"),
+        ("bldg", "elongation"),
+        ("bldg", "convexity"),
+        ("bldg", "orientation"),
+        ("bldg", "distance_closest"),
+        ("bldg", "touches"),
+        ("block", "footprint_area"),
+        ("block", "perimeter"),
+        ("block", "area_perimeter_ratio"),
+        ("block", "elongation"),
+        ("block", "length"),
+        ("address", "count"),
+        ("address", "unit_count"),
+    ]
+    base = buildings[[f"{cat}_{ft}" for cat, ft in diff_fts]].to_numpy(dtype=float, na_value=np.nan)
+    for suffix in H3_BUFFER_SUFFIXES.values():
+        avg = buildings[[f"{cat}_avg_{ft}_{suffix}" for cat, ft in diff_fts]].to_numpy(dtype=float, na_value=np.nan)
+        std = buildings[[f"{cat}_std_{ft}_{suffix}" for cat, ft in diff_fts]].to_numpy(dtype=float, na_value=np.nan)
+        diff = avg - base
+        with np.errstate(divide="ignore", invalid="ignore"):
+            diff_std = diff / std
+        diff_std[np.isinf(diff_std)] = 0
+
+        diff_cols = {}
+        for i, (cat, ft) in enumerate(diff_fts):
+            diff_cols[f"{cat}_diff_{ft}_{suffix}"] = diff[:, i]
+            diff_cols[f"{cat}_diff_std_{ft}_{suffix}"] = diff_std[:, i]
+        buildings = pd.concat([buildings, pd.DataFrame(diff_cols, index=buildings.index)], axis=1)
+
+        shape_fts = ["footprint_area", "perimeter", "elongation", "convexity", "orientation", "distance_closest"]
+        diff_std = [buildings[f"bldg_diff_std_{ft}_{suffix}"].to_numpy(dtype=float) for ft in shape_fts]
+        buildings[f"bldg_diff_std_shape_{suffix}"] = _nanmean_rows(np.abs(np.column_stack(diff_std)))
+
+    hex_grid_type_shares = buffer.calculate_h3_buffer_shares(
+        buildings,
+        "bldg_type",
+        H3_RES,
+        H3_BUFFER_SIZES,
+        h3_cells,
+        dropna=True,
+        n_min=4,
+        exclude_self=True,
+        rings=h3_rings,
+    )
     buildings = buildings.join(hex_grid_type_shares.add_prefix("bldg_type_share_"), how="left")
 
-    hex_grid_res_type_shares = buffer.calculate_h3_buffer_shares(buildings, "bldg_res_type", H3_RES, H3_BUFFER_SIZES, h3_cells, dropna=True, n_min=4, exclude_self=True)
+    hex_grid_res_type_shares = buffer.calculate_h3_buffer_shares(
+        buildings,
+        "bldg_res_type",
+        H3_RES,
+        H3_BUFFER_SIZES,
+        h3_cells,
+        dropna=True,
+        n_min=4,
+        exclude_self=True,
+        rings=h3_rings,
+    )
     buildings = buildings.join(hex_grid_res_type_shares.add_prefix("bldg_res_type_share_"), how="left")
 
     return buildings
 
 
-def _calculate_population_buffer_features(buildings: gpd.GeoDataFrame, pop_file: str) -> gpd.GeoDataFrame:
-    suffix = buffer.ft_suffix(H3_RES - 2)
-    buildings[f"population_{suffix}"] = population.count_population_in_buffer(buildings, pop_file, H3_RES - 2)
+def _calculate_population_buffer_features(
+    buildings: gpd.GeoDataFrame, pop_raster: np.ndarray, pop_meta: dict
+) -> gpd.GeoDataFrame:
+    buildings[f"population_{H3_LARGE_SUFFIX}"] = population.count_population_in_buffer(
+        buildings, pop_raster, pop_meta, H3_RES - 2
+    )
 
     return buildings
 
 
-def _calculate_poi_buffer_features(buildings: gpd.GeoDataFrame, pois_dir: str, region_id: str) -> gpd.GeoDataFrame:
-    pois = poi.load_pois(pois_dir, region_id, CRS)
-
+def _calculate_poi_buffer_features(buildings: gpd.GeoDataFrame, pois: gpd.GeoDataFrame) -> gpd.GeoDataFrame:
     buffer_fts = {"poi_n": ("amenity", "count")}
     buildings = _add_h3_buffer_features(buildings, pois, buffer_fts)
 
-    suffix = buffer.ft_suffix(H3_RES, H3_BUFFER_SIZES[-1])
+    suffix = H3_BUFFER_SUFFIXES[H3_BUFFER_SIZES[-1]]
     buildings["distance_to_center"] = distance_to_max(buildings, f"poi_n_{suffix}")
 
     return buildings
 
 
-def _calculate_GHS_built_up_buffer_features(buildings: gpd.GeoDataFrame, built_up_file: str) -> gpd.GeoDataFrame:
-    bu_raster, meta = builtup.load_built_up(built_up_file, buildings)
-
-    for size in [100, 500]:
-        buildings[f"ghs_height_buffer_{size}"] = builtup.ghs_mean_height(buildings, bu_raster, meta, size)
-        buildings[f"ghs_greenness_buffer_{size}"] = builtup.ghs_mean_ndvi(buildings, bu_raster, meta, size)
-        buildings[f"ghs_type_share_residential_buffer_{size}"] = builtup.ghs_type_share(buildings, bu_raster, meta, size, "residential")
-        buildings[f"ghs_type_share_non_residential_buffer_{size}"] = builtup.ghs_type_share(buildings, bu_raster, meta, size, "non-residential")
+def _calculate_GHS_built_up_buffer_features(
+    buildings: gpd.GeoDataFrame, bu_raster: np.ndarray, meta: dict
+) -> gpd.GeoDataFrame:
+    bldg_centroids = buildings["_centroid"].to_crs(meta["crs"])
+    ghs_means = builtup.ghs_buffer_means(bldg_centroids, bu_raster, meta, [100, 500])
+    buildings = buildings.join(ghs_means.add_prefix("ghs_"))
 
     return buildings
 
 
 def _calculate_interaction_features(buildings: gpd.GeoDataFrame) -> gpd.GeoDataFrame:
-    buildings["i_distance_to_built"] = buildings[["bldg_distance_closest", "street_distance"]].min(axis=1)
-    suffix = buffer.ft_suffix(H3_RES, H3_BUFFER_SIZES[-1])
-    pop_suffix = buffer.ft_suffix(H3_RES - 2)
-
-    buildings["i_distance_to_built_x_population"] = (
-        buildings["bldg_distance_closest_medium"] * buildings[f"population_{pop_suffix}"]
+    # the frame is at its widest here, so the features are collected and added in a single concat
+    fts = {}
+    fts["i_distance_to_built"] = np.fmin(
+        buildings["bldg_distance_closest"].to_numpy(), buildings["street_distance"].to_numpy()
     )
-    buildings["i_distance_to_built_x_population_x_footprint_area"] = (
-        buildings["bldg_distance_closest_medium"] * buildings[f"population_{pop_suffix}"] * np.log(buildings["bldg_footprint_area"])
+    suffix = H3_BUFFER_SUFFIXES[H3_BUFFER_SIZES[-1]]
+
+    # operate on plain arrays to avoid allocating intermediate Series for each product
+    distance = buildings["bldg_distance_closest_medium"].to_numpy(dtype=float, na_value=np.nan)
+    pop = buildings[f"population_{H3_LARGE_SUFFIX}"].to_numpy(dtype=float, na_value=np.nan)
+    total_footprint_area = (
+        buildings[f"bldg_total_footprint_area_{suffix}"].to_numpy(dtype=float, na_value=np.nan) / 1000
     )
-    buildings["i_distance_to_built_x_total_footprint_area"] = (
-        buildings["bldg_distance_closest_medium"] * (buildings[f"bldg_total_footprint_area_{suffix}"] / 1000)
+    distance_x_pop = distance * pop
+
+    fts["i_distance_to_built_x_population"] = distance_x_pop
+    fts["i_distance_to_built_x_population_x_footprint_area"] = distance_x_pop * np.log(
+        buildings["bldg_footprint_area"].to_numpy()
     )
-    buildings["i_population_per_footprint_area"] = (
-        buildings[f"population_{pop_suffix}"] / (buildings[f"bldg_total_footprint_area_{suffix}"] / 1000)
+    fts["i_distance_to_built_x_total_footprint_area"] = distance * total_footprint_area
+    with np.errstate(divide="ignore", invalid="ignore"):
+        fts["i_population_per_footprint_area"] = pop / total_footprint_area
+
+    return pd.concat([buildings, pd.DataFrame(fts, index=buildings.index)], axis=1)
+
+
+def _add_h3_buffer_features(
+    buildings: gpd.GeoDataFrame, gdf: gpd.GeoDataFrame, operation: Dict[str, Tuple[str, Callable]], rings: Dict = None
+) -> gpd.GeoDataFrame:
+    # the factorized h3 index yields both the grid cells (in order of appearance) and each building's row in the grid
+    cell_codes, cells = pd.factorize(buildings["h3_index"], use_na_sentinel=False)
+    hex_grid = buffer.calculate_h3_buffer_features(
+        gdf, operation, H3_RES, H3_BUFFER_SIZES, pd.DataFrame(index=cells), rings
     )
+    buildings = _add_grid_fts_to_buildings(buildings, hex_grid.reindex(cells), cell_codes)
 
     return buildings
 
 
-def _add_h3_buffer_features(buildings: gpd.GeoDataFrame, gdf: gpd.GeoDataFrame, operation: Dict[str, Tuple[str, Callable]]) -> gpd.GeoDataFrame:
-    h3_cells = pd.DataFrame(index=buildings["h3_index"].unique())
-    hex_grid = buffer.calculate_h3_buffer_features(gdf, operation, H3_RES, H3_BUFFER_SIZES, h3_cells)
-    buildings = _add_grid_fts_to_buildings(buildings, hex_grid)
+def _submit_stages(
+    executor: ThreadPoolExecutor,
+    logger: logging.Logger,
+    buildings: gpd.GeoDataFrame,
+    stage_dir: str,
+    stages: List[Tuple[str, Callable, Tuple]],
+) -> List[Future]:
+    """Submit a stage run for each (stage name, feature function, feature function arguments) entry."""
+    return [
+        executor.submit(_run_stage, logger, stage, calculate_fts, buildings, stage_dir, *args)
+        for stage, calculate_fts, args in stages
+    ]
 
-    return buildings
 
+def _run_stage(
+    logger: logging.Logger, stage: str, calculate_fts: Callable, buildings: gpd.GeoDataFrame, stage_dir: str, *args
+) -> str:
+    """
+    Calculate the features of a stage on a copy of the buildings and write them to the stage directory.
+    Stages already completed by a previous, interrupted run with the same buildings, inputs and code are skipped.
+    """
+    with LoggingContext(logger, feature_name=stage):
+        fingerprint = stage_fingerprint(buildings["id"], inspect.getsource(calculate_fts), *args)
+        if stage_features_exist(stage_dir, stage, buildings["id"], fingerprint):
+            logger.info(f"Skipping stage {stage} because already done.")
+            return stage
+
+        stage_bldgs = calculate_fts(buildings.copy(), *args)
+        stage_cols = stage_bldgs.columns.difference(buildings.columns)
+        store_stage_features(stage_bldgs.set_index("id")[stage_cols], stage_dir, stage, fingerprint)
+
+    return stage
 
-def _add_grid_fts_to_buildings(buildings, grid):
-    return buildings.merge(grid, left_on="h3_index", right_index=True, how="left")
+
+def _add_grid_fts_to_buildings(buildings, grid, cell_codes):
+    grid_fts = grid.iloc[cell_codes]
+    grid_fts.index = buildings.index
+
+    return pd.concat([buildings, grid_fts], axis=1)
 
 
 def _fill_block_na_with_bldg_features(buildings: gpd.GeoDataFrame) -> gpd.GeoDataFrame:
@@ -614,9 +845,8 @@ def _fill_block_na_with_bldg_features(buildings: gpd.GeoDataFrame) -> gpd.GeoDat
         "distance_closest",
     ]
 
-    for ft in fts:
-        buildings["block_" + ft] = buildings["block_" + ft].fillna(buildings["bldg_" + ft])
-
+    # fill all columns of a kind at once, the building features are aligned to the block columns by renaming
+    _fill_na_with_bldg_features(buildings, "block_", fts)
     buildings["block_length"] = buildings["block_length"].fillna(1)
 
     fts = [
@@ -625,18 +855,52 @@ def _fill_block_na_with_bldg_features(buildings: gpd.GeoDataFrame) -> gpd.GeoDat
         "elongation",
         "orientation",
     ]
-    for ft in fts:
-        buildings["block_std_" + ft] = buildings["block_std_" + ft].fillna(0)
-        buildings["block_avg_" + ft] = buildings["block_avg_" + ft].fillna(buildings["bldg_" + ft])
-        buildings["block_diff_" + ft] = buildings["block_diff_" + ft].fillna(0)
-        buildings["block_diff_std_" + ft] = buildings["block_diff_std_" + ft].replace([np.inf, -np.inf], 0)
+    zero_cols = [f"block_{kind}_{ft}" for kind in ["std", "diff"] for ft in fts]
+    buildings[zero_cols] = buildings[zero_cols].fillna(0)
+    _fill_na_with_bldg_features(buildings, "block_avg_", fts)
+    diff_std_cols = [f"block_diff_std_{ft}" for ft in fts]
+    buildings[diff_std_cols] = buildings[diff_std_cols].replace([np.inf, -np.inf], 0)
+
+    return buildings
+
+
+def _fill_na_with_bldg_features(buildings: gpd.GeoDataFrame, prefix: str, fts: List[str]) -> None:
+    cols = [prefix + ft for ft in fts]
+    bldg_fts = buildings[["bldg_" + ft for ft in fts]].set_axis(cols, axis=1)
+    buildings[cols] = buildings[cols].fillna(bldg_fts)
+
+
+def _nanmean_rows(arr: np.ndarray) -> np.ndarray:
+    """Row-wise mean ignoring NaNs, without warning about all-NaN rows (which are NaN as in pandas)."""
+    valid = ~np.isnan(arr)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(valid, arr, 0).sum(axis=1) / valid.sum(axis=1)
+
+
+def _broadcast_categorical(value: str, categories: List[str], n: int) -> pd.Categorical:
+    # build the codes directly instead of materializing the same string for every building
+    code = categories.index(value) if value in categories else -1
+    return pd.Categorical.from_codes(np.full(n, code, dtype=np.int8), categories=categories)
+
+
+def _downcast_float_features(buildings: gpd.GeoDataFrame, cols: pd.Index, keep: List[str]) -> gpd.GeoDataFrame:
+    float_cols = buildings[cols].select_dtypes("float64").columns.difference(keep)
+    buildings[float_cols] = buildings[float_cols].astype(np.float32)
 
     return buildings
 
 
 def _postprocess(buildings: gpd.GeoDataFrame) -> gpd.GeoDataFrame:
-    fts_cols = buildings.filter(
-        regex='^(bldg|block|neighbors|poi|address|street|lu|ghs|nuts|satclip|cdd|hdd|elevation|ruggedness|lat|lng|country|population|distance_to_center|i_)').columns
-    buildings[fts_cols] = buildings[fts_cols].replace([None, -np.inf, np.inf], np.nan)
+    fts_cols = buildings.columns[buildings.columns.str.startswith(FEATURE_PREFIXES)]
+    buildings = _downcast_float_features(buildings, fts_cols, keep=TARGET_ATTRS + ["lat", "lng"])
+
+    # infinite values only occur in float columns, they are masked on one plain array per float dtype
+    for dtype in [np.float32, np.float64]:
+        float_cols = buildings[fts_cols].select_dtypes(dtype).columns
+        values = buildings[float_cols].to_numpy()
+        values[np.isinf(values)] = np.nan
+        buildings[float_cols] = values
+
+    buildings = buildings.drop(columns=buildings.columns[buildings.columns.str.startswith("_")])
 
     return buildings
@@ -1,8 +1,12 @@
 from collections import defaultdict
 
+from typing import List
+
 import geopandas as gpd
+import numpy as np
 import osmnx as ox
 import pandas as pd
+import shapely
 from networkx.exception import NetworkXPointlessConcept
 from shapely.geometry import Polygon
 
@@ -100,6 +104,34 @@ def distance_to_closest_poi(buildings: gpd.GeoDataFrame, pois: gpd.GeoDataFrame,
     return dis.fillna(1000)
 
 
+def distance_to_closest_pois(
+    buildings: gpd.GeoDataFrame, pois: gpd.GeoDataFrame, categories: List[str], centroids: gpd.GeoSeries = None
+) -> pd.DataFrame:
+    """
+    Calculates the distance between each building and the closest POI of each category.
+
+    Args:
+        buildings: A GeoDataFrame containing the buildings.
+        pois: A GeoDataFrame containing the POIs.
+        categories: The POI categories to calculate distances for.
+        centroids: Precomputed building centroids, computed from the buildings if not provided.
+
+    Returns:
+        A DataFrame with the distance to the closest POI per category as columns.
+    """
+    bldg_centroids = (buildings.centroid if centroids is None else centroids).to_numpy()
+    poi_geoms = pois.geometry.to_numpy()
+
+    dis = {}
+    for category in categories:
+        tree = shapely.STRtree(poi_geoms[_filter_mask(pois, OSM_TAGS[category]).to_numpy()])
+        (bldg_i, _), d = tree.query_nearest(bldg_centroids, max_distance=1000, return_distance=True, all_matches=False)
+        dis[category] = np.full(len(bldg_centroids), 1000.0)
+        dis[category][bldg_i] = d
+
+    return pd.DataFrame(dis, index=buildings.index)
+
+
 def _merge_tags(*dicts):
     merged_dict = defaultdict(list)
     for d in dicts:
@@ -115,6 +147,10 @@ def _merge_tags(*dicts):
 
 
 def _filter(df, tags):
+    return df[_filter_mask(df, tags)]
+
+
+def _filter_mask(df, tags):
     mask = pd.Series(False, index=df.index)
     for col, value in tags.items():
         if col not in df.columns:
@@ -127,4 +163,4 @@ def _filter(df, tags):
         else:
             raise ValueError(f"Creating filter mask failed due to unsupported value type: {type(value)}")
 
-    return df[mask]
+    return mask
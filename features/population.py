@@ -1,38 +1,44 @@
 import geopandas as gpd
+import numpy as np
 import pandas as pd
 
 import util
 from features import buffer
 
 
-def load_population(population_file: str, area: gpd.GeoSeries, point_geom: bool) -> gpd.GeoDataFrame:
-    population_raster, city_meta = util.read_area(population_file, area)
-    population = util.raster_to_gdf(population_raster[0], city_meta, point=point_geom)
-    population = population.rename(columns={"values": "population"})
+def load_population_raster(population_file: str, buildings: gpd.GeoDataFrame) -> tuple[np.ndarray, dict]:
+    """
+    Load a cropped section of the population raster for the area around the buildings.
+    """
+    area = util.bbox(buildings, buffer=1000)
+    data, meta = util.read_area(population_file, area)
 
-    return population
+    return data[0], meta
 
 
-def count_local_population(buildings: gpd.GeoDataFrame, population_file: str) -> pd.Series:
-    area = util.bbox(buildings, buffer=1000)
-    pop = load_population(population_file, area, point_geom=False)
-    pop = pop.to_crs(buildings.crs)
+def load_population(population_raster: np.ndarray, city_meta: dict, point_geom: bool) -> gpd.GeoDataFrame:
+    population = util.raster_to_gdf(population_raster, city_meta, point=point_geom)
+    population = population.rename(columns={"values": "population"})
+
+    return population
 
-    bldg_centroids = buildings.centroid.to_frame()
-    pop = gpd.sjoin(bldg_centroids, pop, how="left", predicate="within")["population"]
 
-    return pop
+def count_local_population(points: gpd.GeoSeries, population_raster: np.ndarray, city_meta: dict) -> pd.Series:
+    # sample the raster cells directly instead of spatially joining the points with one polygon per cell
+    return util.read_values(points, population_raster, city_meta)
 
 
-def count_population_in_buffer(buildings: gpd.GeoDataFrame, population_file: str, h3_res: int) -> pd.Series:
-    area = util.bbox(buildings, buffer=1000)
-    pop = load_population(population_file, area, point_geom=True)
+def count_population_in_buffer(
+    buildings: gpd.GeoDataFrame, population_raster: np.ndarray, city_meta: dict, h3_res: int
+) -> pd.Series:
+    pop = load_population(population_raster, city_meta, point_geom=True)
 
     h3_idx = f"h3_{h3_res}"
     buffer_fts = {"total_population": ("population", "sum")}
     hex_grid = buffer.aggregate_to_h3_grid(pop, buffer_fts, h3_res)
 
-    buildings[h3_idx] = buffer.h3_index(buildings, h3_res)
+    if h3_idx not in buildings.columns:
+        buildings[h3_idx] = buffer.h3_index(buildings, h3_res)
     total_pop = buildings.merge(hex_grid, left_on=h3_idx, right_index=True, how="left")["population"]
 
     return total_pop
@@ -1,10 +1,16 @@
+from functools import lru_cache
+
 import geopandas as gpd
 import numpy as np
 import pandas as pd
 from pandas.api.types import CategoricalDtype
 
 
+@lru_cache(maxsize=4)
 def load_nuts_attr(lau_path: str) -> pd.DataFrame:
+    """
+    Load NUTS attributes indexed by NUTS 3 id. The result is cached and shared between callers, don't modify it.
+    """
     nuts = pd.read_csv(lau_path)
     nuts = nuts.drop_duplicates(subset=["NUTS_ID_3"])
     nuts = nuts.set_index("NUTS_ID_3")
@@ -1,4 +1,5 @@
 import geopandas as gpd
+import numpy as np
 import pandas as pd
 
 from features import buffer
@@ -16,7 +17,13 @@ def add_h3_embeddings(buildings: gpd.GeoDataFrame, satclip_path: str) -> gpd.Geo
         A GeoDataFrame with the merged SatCLIP embeddings.
     """
     embeddings = pd.read_parquet(satclip_path).add_prefix("satclip_")
-    buildings['h3_08'] = buffer.h3_index(buildings, 8)
-    buildings = buildings.merge(embeddings, left_on='h3_08', right_index=True, how="left")
+    # the embeddings are stored as float32 features anyway, casting first halves the gathered block
+    float_cols = embeddings.select_dtypes("float64").columns
+    embeddings[float_cols] = embeddings[float_cols].astype(np.float32)
+    if 'h3_08' not in buildings.columns:
+        buildings['h3_08'] = buffer.h3_index(buildings, 8)
+    # look up the embeddings by h3 index instead of merging the whole frame
+    cell_embeddings = embeddings.reindex(buildings['h3_08'].to_numpy()).set_axis(buildings.index)
+    buildings = pd.concat([buildings, cell_embeddings], axis=1)
 
     return buildings
@@ -1,9 +1,10 @@
-from typing import Dict, List, Union
+from typing import Dict
 
 import geopandas as gpd
 import momepy
 import numpy as np
 import osmnx as ox
+import pandas as pd
 from networkx.exception import NetworkXPointlessConcept
 from shapely.geometry import Polygon
 
@@ -86,7 +87,7 @@ def closest_street_features(buildings: gpd.GeoDataFrame, streets: gpd.GeoDataFra
     if "bldg_orientation" not in buildings.columns:
         buildings["bldg_orientation"] = momepy.orientation(buildings)
 
-    streets["size"] = streets["highway"].apply(_preprocess_highway_type)
+    streets["size"] = _road_size(streets["highway"])
     buildings = sjoin_nearest_cols(
         buildings, streets, cols=["size", "street_orientation"], distance_col="distance", max_distance=100
     )
@@ -95,9 +96,12 @@ def closest_street_features(buildings: gpd.GeoDataFrame, streets: gpd.GeoDataFra
     return buildings[["size", "distance", "street_alignment"]]
 
 
-def _preprocess_highway_type(category: Union[str, List[str]]) -> float:
-    return (
-        np.mean([ROAD_SIZE.get(c, np.nan) for c in category])
-        if isinstance(category, list)
-        else ROAD_SIZE.get(category, np.nan)
-    )
+def _road_size(highway: pd.Series) -> pd.Series:
+    # street segments merged from several highway types carry a list of types, whose sizes are averaged
+    highway_types = pd.Series(highway.to_numpy(dtype=object), index=np.arange(len(highway))).explode()
+    sizes = highway_types.map(ROAD_SIZE).astype(float)
+    # unknown types yield NaN for the whole segment (like np.mean) instead of being skipped
+    unknown = sizes.isna().groupby(level=0).any()
+    mean_size = sizes.groupby(level=0).mean().mask(unknown)
+
+    return pd.Series(mean_size.to_numpy(), index=highway.index)
@@ -1,32 +1,43 @@
 import geopandas as gpd
+import numpy as np
 import pandas as pd
 
 import util
 from features import buffer
 
 
-def load_elevation(elevation_file: str, buildings: gpd.GeoDataFrame) -> gpd.GeoDataFrame:
+def load_elevation_raster(elevation_file: str, buildings: gpd.GeoDataFrame) -> tuple[np.ndarray, dict]:
+    """
+    Load a cropped section of the elevation raster for the area around the buildings.
+    """
     area = util.bbox(buildings, buffer=1000)
-    elevation_raster, city_meta = util.read_area(elevation_file, area)
-    elevation = util.raster_to_gdf(elevation_raster[0], city_meta, point=False)
-    elevation = elevation.rename(columns={"values": "elevation"})
-    elevation = elevation.to_crs(buildings.crs)
+    data, meta = util.read_area(elevation_file, area)
 
-    return elevation
+    return data[0], meta
 
 
-def calculate_elevation(buildings: gpd.GeoDataFrame, elevation: gpd.GeoDataFrame) -> pd.Series:
-    bldg_centroids = buildings.centroid.to_frame()
-    elevation = gpd.sjoin(bldg_centroids, elevation, how="left", predicate="within")["elevation"]
+def load_elevation(elevation_raster: np.ndarray, city_meta: dict, crs: str) -> gpd.GeoDataFrame:
+    elevation = util.raster_to_gdf(elevation_raster, city_meta, point=False)
+    elevation = elevation.rename(columns={"values": "elevation"})
+    elevation = elevation.to_crs(crs)
 
     return elevation
 
 
+def calculate_elevation(points: gpd.GeoSeries, elevation_raster: np.ndarray, city_meta: dict) -> pd.Series:
+    # sample the raster cells directly instead of spatially joining the points with one polygon per cell
+    return util.read_values(points, elevation_raster, city_meta)
+
+
 def calculate_ruggedness(buildings: gpd.GeoDataFrame, elevation: gpd.GeoDataFrame, h3_res: int) -> pd.Series:
     h3_idx = f"h3_{h3_res}"
     buffer_fts = {"ruggedness": ("elevation", "std")}
     hex_grid = buffer.aggregate_to_h3_grid(elevation, buffer_fts, h3_res)
-    buildings[h3_idx] = buffer.h3_index(buildings, h3_res)
-    ruggedness = buildings.merge(hex_grid, left_on=h3_idx, right_index=True, how="left")["ruggedness"]
+    if h3_idx not in buildings.columns:
+        buildings[h3_idx] = buffer.h3_index(buildings, h3_res)
+    # look up the grid values by h3 index instead of merging the whole frame
+    ruggedness = pd.Series(
+        hex_grid["ruggedness"].reindex(buildings[h3_idx]).to_numpy(), index=buildings.index, name="ruggedness"
+    )
 
     return ruggedness
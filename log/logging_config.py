@@ -1,5 +1,8 @@
+import atexit
 import logging
+import logging.handlers
 import os
+import queue
 from pathlib import Path
 
 
@@ -29,9 +32,13 @@ def setup_logger(log_file: Path = None) -> logging.Logger:
     logger = logging.getLogger("feature_engineering")
     logger.setLevel(logging.INFO)
 
-    # Add handlers
-    logger.addHandler(stream_handler)
-    logger.addHandler(file_handler)
+    # Write the records in a background thread so that logging does not block the pipeline threads,
+    # the logger's filters still run in the calling thread and inject the feature name before enqueueing
+    log_queue = queue.SimpleQueue()
+    listener = logging.handlers.QueueListener(log_queue, stream_handler, file_handler)
+    listener.start()
+    atexit.register(listener.stop)  # flush the remaining records on exit
+    logger.addHandler(logging.handlers.QueueHandler(log_queue))
 
     # Add the filter to inject default 'feature_name'
     logger.addFilter(DefaultFeatureNameFilter())
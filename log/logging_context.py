@@ -1,17 +1,28 @@
 import logging
+import os
 import psutil
+from contextvars import ContextVar
 from datetime import datetime
 
+# feature name of the innermost context of the current thread,
+# so concurrently running contexts don't mix up their records
+_current_feature_name: ContextVar[str] = ContextVar("feature_name", default=None)
+
+# process handle reused across context exits, recreated in forked children
+_process: psutil.Process = None
+
 
 class LoggingContext:
     def __init__(self, logger: logging.Logger, feature_name: str):
         self.logger = logger
         self.feature_name = feature_name
         self.start_time: datetime = None
+        self.token = None
         self.filter = self._create_filter()
 
     def __enter__(self):
         # Add the pre-created filter dynamically
+        self.token = _current_feature_name.set(self.feature_name)
         self.logger.addFilter(self.filter)
         self.start_time = datetime.now()
         self.logger.info(f"Entering context for feature: {self.feature_name}")
@@ -30,6 +41,7 @@ class LoggingContext:
 
         # Remove the filter to clean up
         self.logger.removeFilter(self.filter)
+        _current_feature_name.reset(self.token)
 
     def _create_filter(self):
         """Creates a filter that dynamically injects the feature_name into log records."""
@@ -40,7 +52,10 @@ class LoggingContext:
                 self.feature_name = feature_name
 
             def filter(self, record):
-                record.feature_name = self.feature_name
+                # records of threads outside of any context keep the default feature name
+                feature_name = _current_feature_name.get()
+                if feature_name:
+                    record.feature_name = feature_name
                 return True
 
         # Provide the `feature_name` to the filter
@@ -48,7 +63,9 @@ class LoggingContext:
 
 
 def _current_memory_usage():
-    process = psutil.Process()
-    mem = process.memory_info().rss / (1024 ** 3)  # in GB
+    global _process
+    if _process is None or _process.pid != os.getpid():
+        _process = psutil.Process()
+    mem = _process.memory_info().rss / (1024 ** 3)  # in GB
     return mem
 
@@ -1,16 +1,24 @@
+import atexit
 import csv
+import glob
+import io
+import os
+from collections import deque
 
-from filelock import FileLock
+import pandas as pd
 
 
 class StatsLogger:
     fieldnames = ["city", "feature", "start_time", "end_time", "duration", "buildings", "comments"]
 
-    def __init__(self, log_path):
-        self.lock_path = log_path
-        self.log_file = f"{log_path}/stats.csv"
-        self.lock = FileLock(f"{log_path}/stats.lock")
+    def __init__(self, log_path, flush_every=64):
+        # one shard per slurm task or process, so concurrent workers never write to the same file
+        shard = os.environ.get("SLURM_ARRAY_TASK_ID", os.getpid())
+        self.log_file = f"{log_path}/stats.{shard}.csv"
+        self.flush_every = flush_every
+        self._buffer = deque()
         self._initialize_csv()
+        atexit.register(self.flush)
 
     def _initialize_csv(self):
         try:
@@ -21,16 +29,30 @@ class StatsLogger:
             pass  # File already exists, no need to write headers again
 
     def log(self, city, feature, start_time, end_time, duration, buildings, comments):
-        data = {
-            "city": city,
-            "feature": feature,
-            "start_time": start_time,
-            "end_time": end_time,
-            "duration": duration,
-            "buildings": buildings,
-            "comments": comments,
-        }
-        with self.lock:
-            with open(self.log_file, mode="a", newline="") as file:
-                writer = csv.DictWriter(file, fieldnames=self.fieldnames)
-                writer.writerow(data)
+        line = io.StringIO()
+        csv.writer(line).writerow([city, feature, start_time, end_time, duration, buildings, comments])
+        self._buffer.append(line.getvalue())
+
+        if len(self._buffer) >= self.flush_every:
+            self.flush()
+
+    def flush(self):
+        if not self._buffer:
+            return
+
+        lines = list(self._buffer)
+        self._buffer.clear()
+        with open(self.log_file, mode="a", newline="") as file:
+            file.writelines(lines)
+
+    @classmethod
+    def merge(cls, log_path) -> pd.DataFrame:
+        """Concatenate the stats of all shards into a single stats.csv."""
+        shards = sorted(glob.glob(f"{log_path}/stats.*.csv"))
+        if shards:
+            stats = pd.concat([pd.read_csv(shard) for shard in shards], ignore_index=True)
+        else:
+            stats = pd.DataFrame(columns=cls.fieldnames)
+        stats.to_csv(f"{log_path}/stats.csv", index=False)
+
+        return stats
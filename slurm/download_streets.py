@@ -5,6 +5,12 @@ import sys
 PROJECT_SRC_PATH = os.path.realpath(os.path.join(__file__, "..", ".."))
 sys.path.append(PROJECT_SRC_PATH)
 
+# GDAL defaults for reading the NUTS regions and writing the street files, set before pyogrio is imported;
+# the environment takes precedence
+os.environ.setdefault("GDAL_CACHEMAX", "1024")
+os.environ.setdefault("GDAL_DISABLE_READDIR_ON_OPEN", "TRUE")
+os.environ.setdefault("PROJ_NETWORK", "OFF")
+
 from features.street import download  # noqa: E402
 from util import download_all_nuts  # noqa: E402
 
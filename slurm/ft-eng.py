@@ -5,6 +5,11 @@ import sys
 PROJECT_SRC_PATH = os.path.realpath(os.path.join(__file__, "..", ".."))
 sys.path.append(PROJECT_SRC_PATH)
 
+# GDAL defaults for the many raster reads, set before rasterio is imported; the environment takes precedence
+os.environ.setdefault("GDAL_CACHEMAX", "1024")
+os.environ.setdefault("GDAL_DISABLE_READDIR_ON_OPEN", "TRUE")
+os.environ.setdefault("PROJ_NETWORK", "OFF")
+
 from features.pipeline import execute_feature_pipeline  # noqa: E402
 
 # function parameters are passed by slurm-pipeline via stdin
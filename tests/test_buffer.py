@@ -0,0 +1,75 @@
+import os
+import sys
+
+import h3
+import numpy as np
+import pandas as pd
+
+PROJECT_SRC_PATH = os.path.realpath(os.path.join(__file__, "..", ".."))
+sys.path.append(PROJECT_SRC_PATH)
+
+from features.buffer import (  # noqa: E402
+    _calculate_hex_rings_aggregate,
+    calculate_h3_buffer_shares,
+    ft_suffix,
+    h3_rings,
+)
+
+RES = 9
+
+
+def _ring_aggregate_per_cell(grid_cells, grid_values, operation, k):
+    # reference implementation reindexing the values for each cell's neighborhood
+    return pd.DataFrame(
+        [grid_values.reindex(list(h3.k_ring(cell, k))).agg(operation) for cell in grid_cells.index],
+        index=grid_cells.index,
+    )
+
+
+def _grid():
+    center = h3.geo_to_h3(45.73, 4.65, RES)
+    cells = sorted(h3.k_ring(center, 3))
+    rng = np.random.default_rng(0)
+
+    grid_cells = pd.DataFrame(index=pd.Index(cells[::2], name="h3_index"))
+    grid_values = pd.DataFrame(
+        {"count": rng.integers(0, 10, len(cells)).astype(float), "height": rng.random(len(cells)) * 20},
+        index=pd.Index(cells, name="h3_index"),
+    ).iloc[::3]
+    grid_values.loc[grid_values.index[1], "height"] = np.nan
+
+    return grid_cells, grid_values
+
+
+def test_h3_rings_aggregate():
+    grid_cells, grid_values = _grid()
+    ks = [1, 2]
+    rings = h3_rings(grid_cells.index, ks)
+
+    for operation in ["sum", "mean"]:
+        result = _calculate_hex_rings_aggregate(grid_cells, grid_values, operation, RES, ks, rings)
+        shared = _calculate_hex_rings_aggregate(grid_cells, grid_values, operation, RES, ks)
+
+        for k in ks:
+            expected = _ring_aggregate_per_cell(grid_cells, grid_values, operation, k)
+            expected = expected.add_suffix("_" + ft_suffix(RES, k))
+            pd.testing.assert_frame_equal(result[expected.columns], expected, check_names=False)
+            pd.testing.assert_frame_equal(shared[expected.columns], expected, check_names=False)
+
+
+def test_h3_buffer_shares_ignore_missing_categories():
+    grid_cells, _ = _grid()
+    types = ["residential", "industrial", "residential", None, "agricultural", "industrial", "residential"]
+    gdf = pd.DataFrame({
+        "h3_index": np.resize(grid_cells.index, 40),
+        "type": np.resize(np.array(types, dtype=object), 40),
+    })
+    categories = ["residential", "commercial", "industrial", "agricultural"]
+    categorical = gdf.assign(type=pd.Categorical(gdf["type"], categories=categories))
+
+    result = calculate_h3_buffer_shares(categorical, "type", RES, 1, dropna=True)
+    expected = calculate_h3_buffer_shares(gdf, "type", RES, 1, dropna=True)
+
+    suffix = ft_suffix(RES, 1)
+    assert list(result.columns) == [f"{t}_{suffix}" for t in ["residential", "industrial", "agricultural"]]
+    pd.testing.assert_frame_equal(result, expected[result.columns])
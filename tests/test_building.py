@@ -0,0 +1,58 @@
+import os
+import sys
+
+import geopandas as gpd
+import momepy
+import numpy as np
+import pytest
+from shapely import Polygon, box
+
+PROJECT_SRC_PATH = os.path.realpath(os.path.join(__file__, "..", ".."))
+sys.path.append(PROJECT_SRC_PATH)
+
+from features import building  # noqa: E402
+
+
+@pytest.fixture
+def buildings():
+    rotated = Polygon([(30, 0), (38, 6), (32, 14), (24, 8)])
+    l_shape = Polygon([(0, 20), (12, 20), (12, 24), (4, 24), (4, 32), (0, 32)])
+    courtyard = Polygon([(40, 20), (60, 20), (60, 40), (40, 40)], [[(45, 25), (55, 25), (55, 35), (45, 35)]])
+    noisy = Polygon([(70, 0), (75, 0.2), (80, 0), (80, 10), (70, 10)])
+    geoms = [box(0, 0, 10, 10), box(10, 0, 20, 5), box(10, 5, 20, 10), rotated, l_shape, courtyard, noisy]
+
+    return gpd.GeoDataFrame(geometry=geoms, index=np.arange(10, 10 + len(geoms)), crs=3035)
+
+
+def test_calculate_shared_walls(buildings):
+    expected = momepy.shared_walls(buildings)
+
+    result = building.calculate_shared_walls(buildings)
+
+    np.testing.assert_allclose(result, expected)
+    assert result.index.equals(buildings.index)
+
+
+def test_calculate_rectangle_metrics(buildings):
+    result = building.calculate_rectangle_metrics(buildings)
+
+    np.testing.assert_allclose(result["elongation"], momepy.elongation(buildings))
+    np.testing.assert_allclose(result["rectangularity"], momepy.equivalent_rectangular_index(buildings))
+    np.testing.assert_allclose(result["orientation"], momepy.orientation(buildings))
+
+
+def test_calculate_outline_metrics(buildings):
+    result = building.calculate_outline_metrics(buildings)
+
+    np.testing.assert_allclose(result["longest_axis_length"], momepy.longest_axis_length(buildings))
+    np.testing.assert_allclose(result["convexity"], momepy.convexity(buildings))
+    np.testing.assert_allclose(result["courtyard_area"], momepy.courtyard_area(buildings))
+
+
+def test_calculate_corners(buildings):
+    expected = momepy.corners(buildings.simplify(0.5), eps=45)
+
+    result = building.calculate_corners(buildings, tolerance=0.5, eps=45)
+
+    np.testing.assert_array_equal(result, expected)
+    assert result.index.equals(buildings.index)
@@ -1,50 +1,236 @@
 import os
 import sys
-from pathlib import Path
+
+import geopandas as gpd
+import h3
+import numpy as np
+import pandas as pd
+import pytest
+import rasterio
+from rasterio.transform import from_origin
+from shapely import LineString, MultiPolygon, Point, box
 
 PROJECT_SRC_PATH = os.path.realpath(os.path.join(__file__, "..", ".."))
 sys.path.append(PROJECT_SRC_PATH)
 
 from features.pipeline import execute_feature_pipeline  # noqa: E402
 
+LFS_POINTER_HEADER = b"version https://git-lfs.github.com/spec/v1"
+SYNTHETIC_REGION_ID = "Synthetic"
+
+
+@pytest.fixture(scope="session")
+def test_data():
+    """Paths of the test region inputs tracked with Git LFS, shared by all variants of the test."""
+    test_data_dir = os.path.join(PROJECT_SRC_PATH, "tests", "data")
+
+    return {
+        "region_id": "Vaugneray",
+        "bldgs_dir": os.path.join(test_data_dir, "bldgs-881f902143fffff"),
+        "addresses_path": os.path.join(test_data_dir, "overture_addresses_test_region.parquet"),
+        "streets_dir": os.path.join(test_data_dir, "streets"),
+        "pois_dir": os.path.join(test_data_dir, "pois"),
+        "built_up_path": os.path.join(test_data_dir, "GHS_BUILT_test_region.tif"),
+        "lu_path": os.path.join(test_data_dir, "CORINE_landuse_test_region.tif"),
+        "oceans_path": os.path.join(test_data_dir, "OSM_oceans_test_region.gpkg"),
+        "topo_path": os.path.join(test_data_dir, "GMTED_topography_test_region.tif"),
+        "cdd_path": os.path.join(test_data_dir, "CDD_historical_mean_v1.nc"),
+        "hdd_path": os.path.join(test_data_dir, "HDD_historical_mean_v1.nc"),
+        "pop_path": os.path.join(test_data_dir, "GHS_POP_test_region.tif"),
+        "lau_path": os.path.join(test_data_dir, "NUTS_LAU_attr_test_region.csv"),
+        "satclip_path": os.path.join(test_data_dir, "satclip_res8_pca64_test_region.parquet"),
+    }
+
+
+@pytest.fixture(scope="session")
+def synthetic_data(tmp_path_factory):
+    """Inputs of a small synthetic region, which run the whole pipeline without the Git LFS test data."""
+    data_dir = str(tmp_path_factory.mktemp("synthetic_data"))
+    _write_synthetic_region(data_dir, SYNTHETIC_REGION_ID)
+
+    return {
+        "region_id": SYNTHETIC_REGION_ID,
+        "bldgs_dir": os.path.join(data_dir, "bldgs"),
+        "addresses_path": os.path.join(data_dir, "addresses.parquet"),
+        "streets_dir": os.path.join(data_dir, "streets"),
+        "pois_dir": os.path.join(data_dir, "pois"),
+        "built_up_path": os.path.join(data_dir, "ghs_built.tif"),
+        "lu_path": os.path.join(data_dir, "corine.tif"),
+        "oceans_path": os.path.join(data_dir, "oceans.gpkg"),
+        "topo_path": os.path.join(data_dir, "topo.tif"),
+        "cdd_path": os.path.join(data_dir, "cdd.tif"),
+        "hdd_path": os.path.join(data_dir, "hdd.tif"),
+        "pop_path": os.path.join(data_dir, "pop.tif"),
+        "lau_path": os.path.join(data_dir, "lau.csv"),
+        "satclip_path": os.path.join(data_dir, "satclip.parquet"),
+    }
+
+
+@pytest.fixture
+def inputs(request, test_data, synthetic_data):
+    if request.param == "synthetic":
+        return synthetic_data
+
+    inputs = {**test_data, "bldgs_dir": os.path.join(PROJECT_SRC_PATH, "tests", "data", request.param)}
+    missing = [p for k, p in inputs.items() if k != "region_id" and not _data_present(p)]
+    if missing:
+        pytest.skip(f"Test data not present (missing or Git LFS pointer only): {missing}")
+
+    return inputs
+
+
+@pytest.mark.parametrize("inputs", ["synthetic", "bldgs-881f902143fffff", "bldgs"], indirect=True)
+def test_pipeline(inputs, tmp_path):
+    region_id = inputs["region_id"]
+    out_dir = str(tmp_path)
 
-def test_pipeline():
-    region_id = "Vaugneray"
-    test_dir = os.path.join(PROJECT_SRC_PATH, "tests")
-    test_data_dir = os.path.join(test_dir, "data")
-    bldgs_dir = os.path.join(test_data_dir, "bldgs-881f902143fffff")
-    streets_dir = os.path.join(test_data_dir, "streets")
-    pois_dir = os.path.join(test_data_dir, "pois")
-    addresses_path = os.path.join(test_data_dir, "overture_addresses_test_region.parquet")
-    GHS_built_up_path = os.path.join(test_data_dir, "GHS_BUILT_test_region.tif")
-    corine_lu_path = os.path.join(test_data_dir, "CORINE_landuse_test_region.tif")
-    oceans_path = os.path.join(test_data_dir, "OSM_oceans_test_region.gpkg")
-    topo_path = os.path.join(test_data_dir, "GMTED_topography_test_region.tif")
-    cdd_path = os.path.join(test_data_dir, "CDD_historical_mean_v1.nc")
-    hdd_path = os.path.join(test_data_dir, "HDD_historical_mean_v1.nc")
-    GHS_pop_path = os.path.join(test_data_dir, "GHS_POP_test_region.tif")
-    lau_path = os.path.join(test_data_dir, "NUTS_LAU_attr_test_region.csv")
-    satclip_path = os.path.join(test_data_dir, "satclip_res8_pca64_test_region.parquet")
-    out_dir = test_dir
-    log_file = os.path.join(test_dir, "logs", "features.log")
-    out_file = os.path.join(out_dir, f"{region_id}.parquet")
-
-    Path(out_file).unlink(missing_ok=True)
     execute_feature_pipeline(
         region_id,
-        bldgs_dir,
-        addresses_path,
-        streets_dir,
-        pois_dir,
-        GHS_built_up_path,
-        corine_lu_path,
-        oceans_path,
-        topo_path,
-        cdd_path,
-        hdd_path,
-        GHS_pop_path,
-        lau_path,
-        satclip_path,
+        inputs["bldgs_dir"],
+        inputs["addresses_path"],
+        inputs["streets_dir"],
+        inputs["pois_dir"],
+        inputs["built_up_path"],
+        inputs["lu_path"],
+        inputs["oceans_path"],
+        inputs["topo_path"],
+        inputs["cdd_path"],
+        inputs["hdd_path"],
+        inputs["pop_path"],
+        inputs["lau_path"],
+        inputs["satclip_path"],
         out_dir,
-        log_file,
+        os.path.join(out_dir, "logs", "features.log"),
+    )
+
+    buildings = gpd.read_parquet(os.path.join(inputs["bldgs_dir"], f"{region_id}.parquet"))
+    features = gpd.read_parquet(os.path.join(out_dir, f"{region_id}.parquet"))
+
+    assert sorted(features["id"]) == sorted(buildings["id"])
+    assert not os.path.exists(os.path.join(out_dir, f"{region_id}_stages"))
+    for prefix in ["bldg_", "block_", "neighbors_", "address_", "street_", "poi_", "lu_", "ghs_", "population"]:
+        assert features.columns.str.startswith(prefix).any(), f"no {prefix} features"
+
+
+def _data_present(path: str) -> bool:
+    if os.path.isdir(path):
+        files = [os.path.join(path, f) for f in os.listdir(path)]
+        return len(files) > 0 and all(_data_present(f) for f in files)
+
+    return os.path.isfile(path) and not _is_lfs_pointer(path)
+
+
+def _is_lfs_pointer(path: str) -> bool:
+    # files not fetched with `git lfs pull` are small text files starting with the LFS spec header
+    with open(path, "rb") as f:
+        return f.read(len(LFS_POINTER_HEADER)) == LFS_POINTER_HEADER
+
+
+def _write_synthetic_region(data_dir: str, region_id: str, n: int = 300) -> None:
+    rng = np.random.default_rng(0)
+    for d in ["bldgs", "streets", "pois"]:
+        os.makedirs(os.path.join(data_dir, d))
+
+    # randomly placed rectangular buildings around Vaugneray, some of them touching and some multi-part
+    center = gpd.GeoSeries([Point(4.66, 45.74)], crs=4326).to_crs(3035).iloc[0]
+    types = ["residential", "commercial", "industrial", "public", "agricultural", None]
+    res_types = ["apartment block", "detached single-family house", "terraced house", None]
+    sources = ["osm", "gov", "msft", "other"]
+    geoms, rows = [], []
+    for i in range(n):
+        x, y = center.x + rng.uniform(-1000, 1000), center.y + rng.uniform(-1000, 1000)
+        w, h = rng.uniform(5, 30), rng.uniform(5, 30)
+        geom = box(x, y, x + w, y + h)
+        if i % 7 == 0 and i > 0:
+            prev = geoms[-1].bounds
+            geom = box(prev[2], prev[1], prev[2] + w, prev[1] + h)
+        if i % 50 == 0:
+            geom = MultiPolygon([geom, box(x + w + 2, y, x + w + 5, y + 3)])
+        geoms.append(geom)
+        rows.append({
+            "id": f"b{i}",
+            "source_dataset": sources[i % len(sources)],
+            "height": rng.choice([np.nan, rng.uniform(3, 40)]),
+            "floors": rng.choice([np.nan, float(rng.integers(1, 12))]),
+            "age": rng.choice([np.nan, float(rng.integers(1850, 2020))]),
+            "type": types[i % len(types)],
+            "residential_type": res_types[i % len(res_types)] if i % 6 == 0 else None,
+        })
+    buildings = gpd.GeoDataFrame(rows, geometry=geoms, crs=3035)
+    buildings.to_crs(4326).to_parquet(os.path.join(data_dir, "bldgs", f"{region_id}.parquet"))
+
+    xmin, ymin, xmax, ymax = buildings.total_bounds
+
+    def random_points(size):
+        return gpd.points_from_xy(rng.uniform(xmin, xmax, size), rng.uniform(ymin, ymax, size), crs=3035)
+
+    ends = rng.uniform(-500, 500, (40, 2))
+    lines = [LineString([(p.x, p.y), (p.x + dx, p.y + dy)]) for p, (dx, dy) in zip(random_points(40), ends)]
+    streets = gpd.GeoDataFrame(
+        {
+            "osmid": range(40),
+            "highway": [["primary", "residential", "secondary", "living_street", "unknown"][k % 5] for k in range(40)],
+            "length": 1.0,
+        },
+        geometry=lines,
+        crs=3035,
+    )
+    streets.to_crs(4326).to_file(os.path.join(data_dir, "streets", f"{region_id}.gpkg"), driver="GPKG")
+
+    pois = gpd.GeoDataFrame(
+        {
+            "amenity": [["school", "cafe", "bank", None, "university"][k % 5] for k in range(60)],
+            "shop": ["yes" if k % 4 == 0 else None for k in range(60)],
+            "industrial": ["x" if k % 9 == 0 else None for k in range(60)],
+            "landuse": ["industrial" if k % 11 == 0 else None for k in range(60)],
+        },
+        geometry=random_points(60),
+        crs=3035,
     )
+    pois.to_crs(4326).to_file(os.path.join(data_dir, "pois", f"{region_id}.gpkg"), driver="GPKG")
+
+    addresses = gpd.GeoDataFrame(
+        {"number": [str(k) + ("a" if k % 5 == 0 else "") for k in range(400)]}, geometry=random_points(400), crs=3035
+    )
+    addresses.to_parquet(os.path.join(data_dir, "addresses.parquet"), write_covering_bbox=True)
+
+    def bounds_in(crs, pad):
+        bounds = gpd.GeoSeries([box(xmin, ymin, xmax, ymax)], crs=3035).to_crs(crs).total_bounds
+        return bounds[0] - pad, bounds[1] - pad, bounds[2] + pad, bounds[3] + pad
+
+    def write_raster(file, crs, res, bounds, values, dtype="float32", nodata=None):
+        width, height = int((bounds[2] - bounds[0]) / res) + 1, int((bounds[3] - bounds[1]) / res) + 1
+        with rasterio.open(
+            os.path.join(data_dir, file), "w", driver="GTiff", height=height, width=width, count=1, dtype=dtype,
+            crs=crs, transform=from_origin(bounds[0], bounds[3], res, res), nodata=nodata,
+        ) as dst:
+            dst.write(values((height, width)).astype(dtype), 1)
+
+    ghs_classes = [1, 2, 3, 11, 12, 13, 14, 15, 21, 22, 23, 24, 25, 255]
+    moll_bounds = bounds_in("ESRI:54009", 3000)
+    laea_bounds = bounds_in("EPSG:3035", 3000)
+    write_raster("ghs_built.tif", "ESRI:54009", 10, moll_bounds, lambda s: rng.choice(ghs_classes, s), "uint8", 255)
+    write_raster("pop.tif", "ESRI:54009", 100, moll_bounds, lambda s: rng.uniform(0, 50, s), nodata=-200)
+    write_raster("corine.tif", "EPSG:3035", 100, laea_bounds, lambda s: rng.integers(1, 45, s), "uint8", 0)
+    write_raster("topo.tif", "EPSG:4326", 0.002, bounds_in("EPSG:4326", 0.1), lambda s: rng.uniform(200, 900, s))
+    write_raster("cdd.tif", "EPSG:4326", 0.1, (-10, 35, 30, 70), lambda s: rng.uniform(0, 300, s))
+    write_raster("hdd.tif", "EPSG:4326", 0.1, (-10, 35, 30, 70), lambda s: rng.uniform(1000, 4000, s))
+
+    ocean_bounds = bounds_in("EPSG:3857", 0)
+    oceans = gpd.GeoDataFrame(
+        geometry=[box(ocean_bounds[2] + 20000, ocean_bounds[1], ocean_bounds[2] + 60000, ocean_bounds[3])], crs=3857
+    )
+    oceans.to_file(os.path.join(data_dir, "oceans.gpkg"), driver="GPKG")
+
+    pd.DataFrame({
+        "NUTS_ID_3": [region_id, "Other"],
+        "CNTR_CODE": ["FR", "DE"],
+        "MOUNT_TYPE": [2, 0],
+        "COAST_TYPE": [3, 1],
+        "URBN_TYPE": [1, 2],
+    }).to_csv(os.path.join(data_dir, "lau.csv"), index=False)
+
+    centroids = buildings.centroid.to_crs(4326)
+    cells = sorted({h3.geo_to_h3(p.y, p.x, 8) for p in centroids})
+    embeddings = pd.DataFrame(rng.normal(size=(len(cells), 8)), index=cells, columns=[str(k) for k in range(8)])
+    embeddings.to_parquet(os.path.join(data_dir, "satclip.parquet"))
@@ -0,0 +1,42 @@
+import os
+import sys
+
+import numpy as np
+
+PROJECT_SRC_PATH = os.path.realpath(os.path.join(__file__, "..", ".."))
+sys.path.append(PROJECT_SRC_PATH)
+
+from features.builtup import GHS_CAT_AVG_HEIGHTS, GHS_NDVI_CATS, _class_heights  # noqa: E402
+from util.raster import map_values  # noqa: E402
+
+
+def _map_values_per_class(arr, mapping, default_value=np.nan):
+    # reference implementation with one raster pass per class
+    out = np.full_like(arr, default_value, dtype=float)
+    out[np.isnan(arr)] = np.nan
+    for cls, new_val in mapping.items():
+        out[arr == cls] = new_val
+
+    return out
+
+
+def _height_mapping():
+    return {cls: height for height, classes in GHS_CAT_AVG_HEIGHTS.items() for cls in classes}
+
+
+def test_map_values():
+    rng = np.random.default_rng(0)
+    arr = rng.integers(-2, 30, size=(20, 30)).astype(float)
+    arr[rng.random(arr.shape) < 0.1] = np.nan
+
+    for mapping in [_height_mapping(), GHS_NDVI_CATS]:
+        np.testing.assert_array_equal(map_values(arr, mapping), _map_values_per_class(arr, mapping))
+        np.testing.assert_array_equal(map_values(arr, mapping, 0), _map_values_per_class(arr, mapping, 0))
+
+
+def test_class_heights():
+    classes = np.array([-1, 0, 1, 11, 12, 13, 14, 15, 21, 22, 23, 24, 25, 26, 40])
+
+    expected = np.array([_height_mapping().get(c, np.nan) for c in classes])
+
+    np.testing.assert_array_equal(_class_heights(classes), expected)
@@ -0,0 +1,38 @@
+import os
+import sys
+
+import geopandas as gpd
+from shapely import MultiPolygon, Point, box
+
+PROJECT_SRC_PATH = os.path.realpath(os.path.join(__file__, "..", ".."))
+sys.path.append(PROJECT_SRC_PATH)
+
+from util.spatial import extract_largest_polygons_from_multipolygons  # noqa: E402
+
+
+def _largest_polygon(geom):
+    # reference implementation applied per geometry
+    if isinstance(geom, MultiPolygon):
+        return max(geom.geoms, key=lambda p: p.area)
+    return geom
+
+
+def test_extract_largest_polygons_from_multipolygons():
+    geoms = gpd.GeoSeries(
+        [
+            box(0, 0, 1, 1),
+            MultiPolygon([box(0, 0, 1, 1), box(2, 2, 5, 5), box(6, 6, 8, 8)]),
+            MultiPolygon([box(10, 10, 14, 14), box(20, 20, 21, 21)]),
+            Point(3, 3),
+            None,
+        ],
+        index=[4, 2, 7, 0, 1],
+        crs=3035,
+    )
+
+    result = extract_largest_polygons_from_multipolygons(geoms)
+
+    expected = geoms.apply(_largest_polygon)
+    assert result.index.equals(geoms.index)
+    assert result.crs == geoms.crs
+    assert all(r == e or (r is None and e is None) for r, e in zip(result, expected))
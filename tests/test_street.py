@@ -0,0 +1,28 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+PROJECT_SRC_PATH = os.path.realpath(os.path.join(__file__, "..", ".."))
+sys.path.append(PROJECT_SRC_PATH)
+
+from features.street import ROAD_SIZE, _road_size  # noqa: E402
+
+
+def _road_size_per_segment(category):
+    # reference implementation applied per street segment
+    if isinstance(category, list):
+        return np.mean([ROAD_SIZE.get(c, np.nan) for c in category])
+    return ROAD_SIZE.get(category, np.nan)
+
+
+def test_road_size():
+    highway = pd.Series(
+        ["motorway", ["primary", "secondary"], "unknown", ["primary", "unknown"], None, ["trunk"], "residential"],
+        index=[5, 3, 8, 1, 0, 2, 9],
+    )
+
+    result = _road_size(highway)
+
+    pd.testing.assert_series_equal(result, highway.apply(_road_size_per_segment).astype(float), check_names=False)
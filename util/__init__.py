@@ -1,22 +1,79 @@
-from .data import (
-    download_all_nuts,
-    load_buildings,
-    load_gpkg,
-    nuts_geometries,
-    store_features,
-)
-from .raster import distance_nearest_cell, raster_to_gdf, read_area, read_value, read_values, read_values_pooled, area_mean, map_values
-from .spatial import bbox, center, count_dwithin, distance_nearest, distance_to_max, extract_largest_polygon_from_multipolygon, simplified_rectangular_buffer, sjoin_nearest_cols, snearest, snearest_attr, transform_crs
-from .validation import sample_representative_validation_set, sample_representative_validation_set_across_attributes
+import importlib
+
+# Submodules are imported lazily on first attribute access (PEP 562), so that e.g. the download jobs
+# don't pay for importing rasterio and scipy which only the raster helpers need.
+_SUBMODULE_ATTRS = {
+    "data": [
+        "download_all_nuts",
+        "load_buildings",
+        "load_gpkg",
+        "load_stage_features",
+        "nuts_geometries",
+        "stage_features_exist",
+        "stage_fingerprint",
+        "store_features",
+        "store_stage_features",
+    ],
+    "raster": [
+        "distance_nearest_cell",
+        "raster_to_gdf",
+        "read_area",
+        "read_value",
+        "read_values",
+        "read_values_pooled",
+        "raster_indices",
+        "area_mean",
+        "map_values",
+    ],
+    "spatial": [
+        "bbox",
+        "center",
+        "count_dwithin",
+        "distance_nearest",
+        "distance_to_max",
+        "extract_largest_polygons_from_multipolygons",
+        "simplified_rectangular_buffer",
+        "sjoin_nearest_cols",
+        "snearest",
+        "snearest_attr",
+        "transform_crs",
+        "transform_points",
+    ],
+    "validation": [
+        "sample_representative_validation_set",
+        "sample_representative_validation_set_across_attributes",
+    ],
+}
+_ATTR_SUBMODULES = {attr: submodule for submodule, attrs in _SUBMODULE_ATTRS.items() for attr in attrs}
+
+
+def __getattr__(name):
+    if name not in _ATTR_SUBMODULES:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    module = importlib.import_module(f".{_ATTR_SUBMODULES[name]}", __name__)
+    value = getattr(module, name)
+    globals()[name] = value  # cache, so that later lookups don't go through __getattr__
+
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
+
 
 __all__ = [
     "download_all_nuts",
     "load_buildings",
     "load_gpkg",
     "nuts_geometries",
-    "extract_largest_polygon_from_multipolygon",
+    "extract_largest_polygons_from_multipolygons",
     "simplified_rectangular_buffer",
     "store_features",
+    "stage_features_exist",
+    "stage_fingerprint",
+    "store_stage_features",
+    "load_stage_features",
     "sjoin_nearest_cols",
     "distance_nearest",
     "distance_to_max",
@@ -26,10 +83,12 @@ __all__ = [
     "center",
     "count_dwithin",
     "transform_crs",
+    "transform_points",
     "read_area",
     "read_value",
     "read_values",
     "read_values_pooled",
+    "raster_indices",
     "raster_to_gdf",
     "distance_nearest_cell",
     "area_mean",
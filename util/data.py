@@ -1,8 +1,11 @@
+import hashlib
+import json
 import os
-from typing import Callable, Iterator, Tuple, Union
+from typing import Callable, Iterator, List, Tuple, Union
 
 import numpy as np
 import geopandas as gpd
+import pandas as pd
 from shapely.geometry import MultiPolygon, Polygon
 
 
@@ -15,11 +18,81 @@ def load_buildings(buildings_dir: str, region_id: str) -> gpd.GeoDataFrame:
 
 def store_features(buildings: gpd.GeoDataFrame, out_dir: str, region_id: str):
     out_file = os.path.join(out_dir, f"{region_id}.parquet")
-    buildings.to_parquet(out_file)
+    # write to a temporary file first, so that an interrupted run never leaves behind a partial output file
+    tmp_file = f"{out_file}.tmp"
+    # spatially sorted row groups with a bbox covering column allow readers to skip row groups outside their area
+    if len(buildings) > 0:
+        order = np.argsort(buildings.hilbert_distance().to_numpy(), kind="stable")
+        buildings = buildings.iloc[order].reset_index(drop=True)
+    buildings.to_parquet(
+        tmp_file, compression="zstd", use_dictionary=True, row_group_size=64_000, write_covering_bbox=True
+    )
+    os.replace(tmp_file, out_file)
+
+
+def stage_fingerprint(ids: pd.Series, *args) -> str:
+    """
+    Hash the building ids and the inputs of a stage, so that stage files written by a run
+    with different buildings, input data or stage code are not reused when resuming.
+    """
+    fingerprint = hashlib.sha256(pd.util.hash_pandas_object(ids, index=False).to_numpy().tobytes())
+    for arg in args:
+        if isinstance(arg, gpd.GeoDataFrame):
+            arg = arg.to_wkb(hex=True)
+        if isinstance(arg, pd.DataFrame):
+            fingerprint.update(repr(list(arg.columns)).encode())
+            fingerprint.update(pd.util.hash_pandas_object(arg).to_numpy().tobytes())
+        elif isinstance(arg, np.ndarray):
+            fingerprint.update(repr((arg.shape, arg.dtype.str)).encode())
+            fingerprint.update(np.ascontiguousarray(arg).tobytes())
+        else:
+            fingerprint.update(repr(arg).encode())
+
+    return fingerprint.hexdigest()
+
+
+def stage_features_exist(stage_dir: str, stage: str, ids: pd.Series, fingerprint: str) -> bool:
+    stage_file = os.path.join(stage_dir, f"{stage}.parquet")
+    manifest_file = os.path.join(stage_dir, f"{stage}.json")
+    if not (os.path.exists(stage_file) and os.path.exists(manifest_file)):
+        return False
+
+    with open(manifest_file) as f:
+        manifest = json.load(f)
+    if manifest != {"n_ids": len(ids), "fingerprint": fingerprint}:
+        return False
+
+    # the ids are stored as index, which is read without any of the feature columns
+    stored_ids = pd.read_parquet(stage_file, columns=[]).index
+
+    return np.array_equal(stored_ids.to_numpy(dtype=object), ids.to_numpy(dtype=object))
+
+
+def store_stage_features(fts: pd.DataFrame, stage_dir: str, stage: str, fingerprint: str) -> None:
+    os.makedirs(stage_dir, exist_ok=True)
+    stage_file = os.path.join(stage_dir, f"{stage}.parquet")
+    manifest_file = os.path.join(stage_dir, f"{stage}.json")
+    # write atomically so that an interrupted run never leaves a truncated stage file to resume from,
+    # the manifest is written last and marks the stage file as complete
+    tmp_file = f"{stage_file}.tmp"
+    fts.to_parquet(tmp_file)
+    os.replace(tmp_file, stage_file)
+    with open(f"{manifest_file}.tmp", "w") as f:
+        json.dump({"n_ids": len(fts), "fingerprint": fingerprint}, f)
+    os.replace(f"{manifest_file}.tmp", manifest_file)
+
+
+def load_stage_features(stage_dir: str, stages: List[str]) -> pd.DataFrame:
+    fts = pd.concat([pd.read_parquet(os.path.join(stage_dir, f"{stage}.parquet")) for stage in stages], axis=1)
+    # helper columns like the h3 index at lower resolution can be written by several stages
+    fts = fts.loc[:, ~fts.columns.duplicated()]
+
+    return fts
 
 
 def nuts_geometries(nuts_path: str, crs: str, buffer: int = 0) -> Iterator[Tuple[str, Union[Polygon, MultiPolygon]]]:
-    nuts = gpd.read_file(nuts_path)
+    # only the region id is needed, so skip reading and aggregating the other attributes
+    nuts = gpd.read_file(nuts_path, columns=["NUTS_ID"], engine="pyogrio", use_arrow=True)
     nuts = nuts.dissolve("NUTS_ID")
 
     if buffer:
@@ -32,6 +105,7 @@ def nuts_geometries(nuts_path: str, crs: str, buffer: int = 0) -> Iterator[Tuple
 
 
 def download_all_nuts(download_func: Callable, nuts_path: str, out_path: str, buffer: int = 0) -> None:
+    # regions are downloaded one after another, osmnx' Overpass rate limit handling is not thread-safe
     for nuts_id, nuts_geom in nuts_geometries(nuts_path, crs="EPSG:4326", buffer=buffer):
         file_path = os.path.join(out_path, f"{nuts_id}.gpkg")
 
@@ -45,11 +119,11 @@ def download_all_nuts(download_func: Callable, nuts_path: str, out_path: str, bu
             print(f"Download failed for NUTS region {nuts_id}.")
             continue
 
-        gdf.to_file(file_path, driver="GPKG")
+        gdf.to_file(file_path, driver="GPKG", engine="pyogrio")
 
 
 def load_gpkg(data_dir: str, region_id: str) -> gpd.GeoDataFrame:
     gdf_file = os.path.join(data_dir, f"{region_id}.gpkg")
-    gdf = gpd.read_file(gdf_file)
+    gdf = gpd.read_file(gdf_file, engine="pyogrio", use_arrow=True)
 
     return gdf
@@ -1,13 +1,14 @@
-from typing import Union
+from typing import Tuple, Union
 
 import geopandas as gpd
 import numpy as np
 import pandas as pd
 import rasterio.mask
 import rasterio.transform
+import shapely
 from rasterio.transform import rowcol
+from rasterio.windows import Window
 from scipy.ndimage import distance_transform_edt
-from shapely.geometry import box
 from scipy.ndimage import maximum_filter, uniform_filter
 
 
@@ -15,21 +16,15 @@ def raster_to_gdf(
     raster_data: Union[np.ndarray, np.ma.MaskedArray], meta: dict, point: bool = True
 ) -> gpd.GeoDataFrame:
     rows, cols = raster_data.shape
-    xs, ys = np.meshgrid(np.arange(cols), np.arange(rows))
+    transform = meta["transform"]
 
     if point:
-        xs, ys = rasterio.transform.xy(meta["transform"], ys, xs, offset="center")
-        xs = np.array(xs).flatten()
-        ys = np.array(ys).flatten()
+        xs, ys = _cell_coords(transform, rows, cols, offset=0.5)
         geom = gpd.points_from_xy(xs, ys)
     else:
-        x_min, y_min = rasterio.transform.xy(meta["transform"], ys, xs, offset="ul")
-        x_max, y_max = rasterio.transform.xy(meta["transform"], ys, xs, offset="lr")
-        x_min = np.array(x_min).flatten()
-        x_max = np.array(x_max).flatten()
-        y_min = np.array(y_min).flatten()
-        y_max = np.array(y_max).flatten()
-        geom = [box(*box_coords) for box_coords in list(zip(x_min, y_min, x_max, y_max))]
+        x_min, y_min = _cell_coords(transform, rows, cols, offset=0)
+        x_max, y_max = _cell_coords(transform, rows, cols, offset=1)
+        geom = shapely.box(x_min, y_min, x_max, y_max)
 
     values = raster_data.flatten()
     values = pd.Series(values, name="values")
@@ -44,16 +39,16 @@ def read_area(filepath: str, geometries: gpd.GeoSeries):
         # Convert to CRS of TIF file
         geometries = geometries.to_crs(src.crs).values
 
-        # Read rastered data only in specific areas
-        data, out_transform = rasterio.mask.mask(src, geometries, crop=True)
+        # Read rastered data of the first band only in specific areas
+        data, out_transform = rasterio.mask.mask(src, geometries, crop=True, indexes=[1])
 
-        # Convert to float array for NaN support
-        data = data.astype(float)
+        # Convert to float array for NaN support, single precision suffices for the raster values
+        data = data.astype(np.float32)
 
         # Replace nodata values with np.nan
         nodata = src.nodata
         if nodata is not None:
-            data[data == nodata] = np.nan
+            data[data == np.float32(nodata)] = np.nan
 
         # Update meta data
         city_meta = src.meta.copy()
@@ -64,16 +59,14 @@ def read_area(filepath: str, geometries: gpd.GeoSeries):
 
 def read_value(filepath: str, lon: float, lat: float, approx: bool = False):
     with rasterio.open(filepath, crs="EPSG:4326") as src:
-        coord = src.index(lon, lat)
-        value = src.read(1)[coord]  # first band
+        row, col = src.index(lon, lat)
+        # read only the pixel (or its 3x3 neighborhood) instead of the whole band
+        value = src.read(1, window=Window(col, row, 1, 1))[0, 0]  # first band
 
         if approx and np.isnan(value):
             print(f"Value at lat {lat:.3f}, lon {lon:.3f} is NaN. Calculating average over 3x3 grid around location.")
-            x_min = coord[0] - 1
-            x_max = coord[0] + 2
-            y_min = coord[1] - 1
-            y_max = coord[1] + 2
-            values = src.read(1)[x_min:x_max, y_min:y_max]
+            window = Window.from_slices((max(row - 1, 0), row + 2), (max(col - 1, 0), col + 2))
+            values = src.read(1, window=window)
             value = np.nanmean(values)
 
     return value
@@ -98,21 +91,29 @@ def read_few_values(filepath: str, points: gpd.GeoSeries) -> pd.Series:
     return pd.Series(values, index=points.index)
 
 
-def read_values(points: gpd.GeoSeries, raster_data: np.ndarray, meta: dict) -> pd.Series:
-    rows, cols = _geom_to_rowcol(points, meta["transform"], meta["crs"])
+def read_values(
+    points: gpd.GeoSeries, raster_data: np.ndarray, meta: dict, indices: Tuple[np.ndarray, np.ndarray] = None
+) -> pd.Series:
+    rows, cols = indices if indices is not None else raster_indices(points, meta)
     values = raster_data[rows, cols]
 
     return pd.Series(values, index=points.index)
 
 
-def read_values_pooled(points: gpd.GeoSeries, raster_data: np.ndarray, meta: dict, window_size: int) -> pd.Series:
+def read_values_pooled(
+    points: gpd.GeoSeries,
+    raster_data: np.ndarray,
+    meta: dict,
+    window_size: int,
+    indices: Tuple[np.ndarray, np.ndarray] = None,
+) -> pd.Series:
     # Apply local max pooling
     data_filled = np.nan_to_num(raster_data, nan=-np.inf)
     pooled = maximum_filter(data_filled, size=window_size, mode="nearest")
     pooled[pooled == -np.inf] = np.nan
 
     # Convert (x, y) to raster indices
-    rows, cols = _geom_to_rowcol(points, meta["transform"], meta["crs"])
+    rows, cols = indices if indices is not None else raster_indices(points, meta)
 
     # Sample directly from the pooled array
     values = pooled[rows, cols]
@@ -120,17 +121,22 @@ def read_values_pooled(points: gpd.GeoSeries, raster_data: np.ndarray, meta: dic
     return pd.Series(values, index=points.index)
 
 
-def distance_nearest_cell(points: gpd.GeoSeries, raster_data: np.ndarray, meta: dict, mask: np.ndarray) -> pd.Series:
+def distance_nearest_cell(
+    points: gpd.GeoSeries,
+    raster_data: np.ndarray,
+    meta: dict,
+    mask: np.ndarray,
+    indices: Tuple[np.ndarray, np.ndarray] = None,
+) -> pd.Series:
     if not np.any(mask):
         return pd.Series(np.nan, index=points.index)
 
-    # Compute distance transform (in meters)
+    # Compute distance transform (in meters), scaling by the pixel size inside the EDT kernel
     px_size = meta["transform"].a
-    dist_pixels = distance_transform_edt(~mask)
-    dist_meters = dist_pixels * px_size
+    dist_meters = distance_transform_edt(~mask, sampling=px_size)
 
     # Sample distances at coordinates
-    rows, cols = _geom_to_rowcol(points, meta["transform"], meta["crs"])
+    rows, cols = indices if indices is not None else raster_indices(points, meta)
 
     # Set out-of-bounds to NaN
     dist_values = np.full(len(points), np.nan)
@@ -143,25 +149,52 @@ def distance_nearest_cell(points: gpd.GeoSeries, raster_data: np.ndarray, meta:
     return pd.Series(dist_values, index=points.index)
 
 
-def area_mean(points: gpd.GeoSeries, raster_data: np.ndarray, meta: dict, buffer: int) -> pd.Series:
+def area_mean(
+    points: gpd.GeoSeries,
+    raster_data: np.ndarray,
+    meta: dict,
+    buffer: int,
+    indices: Tuple[np.ndarray, np.ndarray] = None,
+) -> pd.Series:
     px_buffer = _metric_buffer_to_px(buffer, meta["transform"])
     mean_values = _mean_pooling(raster_data, block_size=px_buffer)
-    rows, cols = _geom_to_rowcol(points, meta["transform"], meta["crs"])
+    rows, cols = indices if indices is not None else raster_indices(points, meta)
     point_values = mean_values[rows, cols]
 
     return pd.Series(point_values, index=points.index)
 
 
+def raster_indices(points: gpd.GeoSeries, meta: dict) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Raster row and column indices of the points (or geometry centroids), which can be computed once
+    and passed to several raster lookups on rasters sharing the same grid.
+    """
+    return _geom_to_rowcol(points, meta["transform"], meta["crs"])
+
+
 def map_values(arr: np.ndarray, mapping: dict, default_value=np.nan):
     """Remap raster classes to numeric values, keeping NaNs untouched."""
-    out = np.full_like(arr, default_value, dtype=float)
+    # look up all cells in the sorted classes at once instead of one full raster pass per class
+    classes = np.array(sorted(mapping), dtype=float)
+    new_values = np.array([mapping[cls] for cls in classes], dtype=float)
+    pos = np.minimum(np.searchsorted(classes, arr), len(classes) - 1)
+
+    out = np.where(classes[pos] == arr, new_values[pos], default_value)
     out[np.isnan(arr)] = np.nan
-    for cls, new_val in mapping.items():
-        out[arr == cls] = new_val
 
     return out
 
 
+def _cell_coords(transform: rasterio.Affine, rows: int, cols: int, offset: float) -> tuple[np.ndarray, np.ndarray]:
+    # broadcast the row and column offsets through the affine transform instead of materializing a meshgrid
+    col_idx = np.arange(cols)[np.newaxis, :] + offset
+    row_idx = np.arange(rows)[:, np.newaxis] + offset
+    xs = transform.a * col_idx + transform.b * row_idx + transform.c
+    ys = transform.d * col_idx + transform.e * row_idx + transform.f
+
+    return xs.ravel(), ys.ravel()
+
+
 def _geom_to_rowcol(points: gpd.GeoSeries, transform: rasterio.Affine, crs: str) -> pd.Series:
     if (points.geometry.type != "Point").all():
         points = points.centroid
@@ -183,17 +216,16 @@ def _metric_buffer_to_px(buffer: int, transform: rasterio.Affine) -> int:
 def _nanmean_pooling(raster_data: np.ndarray, size: int) -> np.ndarray:
     """Apply NaN-safe mean filter with rectangular kernel."""
 
-    # Count of valid (non-NaN) pixels
-    valid = (~np.isnan(raster_data)).astype(float)
-    count = uniform_filter(valid, size=size, mode="nearest") * (size * size)
-
-    # Sum of values in window (undoing uniform_filter's normalization)
-    data_filled = np.nan_to_num(raster_data, nan=0.0)
-    summed = uniform_filter(data_filled, size=size, mode="nearest") * (size * size)
+    # Share of valid (non-NaN) pixels and mean of the NaN-filled values per window; the window size
+    # normalization of uniform_filter cancels out in the ratio, so neither needs to be undone
+    nan_mask = np.isnan(raster_data)
+    valid_share = uniform_filter((~nan_mask).astype(np.float32), size=size, mode="nearest")
+    data_filled = np.where(nan_mask, 0.0, raster_data).astype(np.float32, copy=False)
+    filled_mean = uniform_filter(data_filled, size=size, mode="nearest")
 
-    # Mean ignoring NaNs
-    mean = np.divide(summed, count, where=count > 0.001)
-    mean[count < 0.001] = np.nan  # keep fully-NaN windows as NaN
+    # Mean ignoring NaNs, keeping fully-NaN windows as NaN
+    mean = np.full_like(filled_mean, np.nan)
+    np.divide(filled_mean, valid_share, out=mean, where=valid_share * (size * size) > 0.001)
 
     return mean
 
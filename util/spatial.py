@@ -1,13 +1,17 @@
-from typing import Dict, List, Union
+import threading
+from typing import Dict, List, Tuple, Union
 
 import numpy as np
 import geopandas as gpd
 import pandas as pd
+import shapely
 from pyproj import Transformer
-from shapely.geometry import MultiPolygon, Point, box
+from shapely.geometry import Point, box
 from shapely.geometry.base import BaseGeometry
 from shapely.ops import transform
 
+_transformers = threading.local()
+
 
 def sjoin_nearest_cols(
     gdf1: gpd.GeoDataFrame,
@@ -20,13 +24,18 @@ def sjoin_nearest_cols(
         gdf2 = gdf2.rename(columns=cols)
         cols = list(cols.values())
 
-    gdf1 = gdf1.sjoin_nearest(
-        gdf2[["geometry"] + cols], how="left", distance_col=distance_col, max_distance=max_distance
+    # a single nearest neighbor per row, so no duplicate rows for equidistant matches need to be dropped afterwards
+    (left_i, right_i), dis = gdf2.sindex.nearest(
+        gdf1.geometry, return_all=False, return_distance=True, max_distance=max_distance
     )
-    gdf1 = gdf1.drop(columns="index_right")
-    gdf1 = gdf1[~gdf1.index.duplicated()]
+    nearest = gdf2[cols].iloc[right_i].set_axis(gdf1.index[left_i])
+
+    gdf1 = gdf1.copy()
+    gdf1[cols] = nearest.reindex(gdf1.index)
     if distance_col:
-        gdf1[distance_col] = gdf1[distance_col].fillna(max_distance)
+        distance = np.full(len(gdf1), np.nan if max_distance is None else max_distance, dtype=float)
+        distance[left_i] = dis
+        gdf1[distance_col] = distance
 
     return gdf1
 
@@ -61,16 +70,21 @@ def snearest(left: gpd.GeoDataFrame, right: gpd.GeoDataFrame, max_distance: floa
     return nearest
 
 
-def distance_nearest(left: gpd.GeoDataFrame, right: gpd.GeoDataFrame, max_distance: float = None, exclusive: bool = False) -> pd.Series:
+def distance_nearest(
+    left: gpd.GeoDataFrame,
+    right: Union[gpd.GeoDataFrame, gpd.GeoSeries],
+    max_distance: float = None,
+    exclusive: bool = False,
+) -> pd.Series:
     exclusive = left is right or exclusive
     (left_i, _), dis = right.sindex.nearest(
         left.geometry, return_all=False, return_distance=True, max_distance=max_distance, exclusive=exclusive
     )
 
-    s = pd.Series(None, index=left.index, name="distance")
-    s.iloc[left_i] = dis
+    distance = np.full(len(left), np.nan)
+    distance[left_i] = dis
 
-    return s
+    return pd.Series(distance, index=left.index, name="distance")
 
 
 def distance_to_max(gdf: gpd.GeoDataFrame, attr: str):
@@ -115,18 +129,44 @@ def center(geom: Union[gpd.GeoSeries, gpd.GeoDataFrame]) -> Point:
 
 
 def transform_crs(geom: BaseGeometry, source_crs: str, target_crs: str) -> BaseGeometry:
-    transformer = Transformer.from_crs(source_crs, target_crs, always_xy=True)
+    transformer = _get_transformer(source_crs, target_crs)
     transformed_geom = transform(transformer.transform, geom)
 
     return transformed_geom
 
 
+def transform_points(points: gpd.GeoSeries, target_crs: str) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Transform point geometries to the target CRS and return the coordinate arrays,
+    without constructing the intermediate point geometries.
+    """
+    transformer = _get_transformer(points.crs, target_crs)
+    x, y = transformer.transform(shapely.get_x(points.array), shapely.get_y(points.array))
+
+    return x, y
+
+
+def _get_transformer(source_crs: str, target_crs: str) -> Transformer:
+    # initializing a PROJ pipeline is expensive, but transformers are not thread-safe, so cache them per thread
+    cache = _transformers.__dict__.setdefault("cache", {})
+    key = (source_crs, target_crs)
+    if key not in cache:
+        cache[key] = Transformer.from_crs(source_crs, target_crs, always_xy=True)
+
+    return cache[key]
+
+
 def simplified_rectangular_buffer(geoms: gpd.GeoSeries, size: float) -> gpd.GeoSeries:
     return geoms.simplify(0.1).buffer(size, join_style="mitre")
 
 
-def extract_largest_polygon_from_multipolygon(geom):
-    if isinstance(geom, MultiPolygon):
-        return max(geom.geoms, key=lambda a: a.area)
+def extract_largest_polygons_from_multipolygons(geoms: gpd.GeoSeries) -> gpd.GeoSeries:
+    geoms_arr = geoms.to_numpy().copy()
+    multi_idx = np.flatnonzero(shapely.get_type_id(geoms_arr) == shapely.GeometryType.MULTIPOLYGON)
+
+    if len(multi_idx):
+        parts, part_idx = shapely.get_parts(geoms_arr[multi_idx], return_index=True)
+        largest = pd.Series(shapely.area(parts)).groupby(part_idx).idxmax()
+        geoms_arr[multi_idx[largest.index]] = parts[largest.to_numpy()]
 
-    return geom
+    return gpd.GeoSeries(geoms_arr, index=geoms.index, crs=geoms.crs)
@@ -17,7 +17,7 @@ def sample_representative_validation_set_across_attributes(
     """
     # Generate attribute-specific validation masks and combine them
     val_masks = [sample_representative_validation_set(gdf, attr, representative_attrs, val_size) for attr in target_attrs]
-    val_mask = np.logical_or(*val_masks)
+    val_mask = np.logical_or.reduce(val_masks)
 
     # Limit the size of the validation set to the specified fraction of labeled data
     n_labeled = (gdf[target_attrs].notna().any(axis=1)).sum()
@@ -40,8 +40,7 @@ def sample_representative_validation_set(
     """
     gdf = gdf[representative_attrs + [attr]].replace([np.inf, -np.inf], np.nan)
 
-    for col in representative_attrs:
-        gdf[col] = gdf[col].fillna(gdf[col].mean())
+    gdf[representative_attrs] = gdf[representative_attrs].fillna(gdf[representative_attrs].mean())
 
     na_mask = gdf[attr].isna()
     df_labeled = gdf[~na_mask]
@@ -63,8 +62,9 @@ def sample_representative_validation_set(
     n = int(np.ceil((1 / unlabeled_ratio) * val_size))
 
     # determine representatives among labeled data that are close to unlabeled data
-    nn = NearestNeighbors(n_neighbors=n).fit(X_labeled)
-    dist, idx = nn.kneighbors(X_unlabeled)
+    # the feature space is low-dimensional, so a kd-tree queried in parallel is the fastest exact search
+    nn = NearestNeighbors(n_neighbors=n, algorithm="kd_tree", n_jobs=-1).fit(X_labeled)
+    idx = nn.kneighbors(X_unlabeled, return_distance=False)
     representative_indices = X_labeled.index[np.unique(idx.flatten())]
 
     # decrease number of representatives when unlabeled_ratio is above desired validation set size (val_size)